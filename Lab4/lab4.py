@@ -1,11 +1,325 @@
+import gzip
+import hashlib
+import io
+import math
+import queue
 import random
 import re
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class CompiledPattern:
+    def __init__(self, regex_str, tokens):
+        self.regex = regex_str
+        self.tokens = tokens
+        self.token_languages = [self._token_language(alternatives, counts)
+                                for _, alternatives, counts in tokens]
+        self.min_length = sum(min(lang) for lang in self.token_languages)
+        self.max_length = sum(max(lang) for lang in self.token_languages)
+
+    @staticmethod
+    def _token_language(alternatives, counts):
+        by_length = {}
+        for count in counts:
+            for alternative in alternatives:
+                value = alternative * count
+                by_length.setdefault(len(value), set()).add(value)
+        return {length: sorted(values) for length, values in by_length.items()}
+
+    def __repr__(self):
+        return f"CompiledPattern('{self.regex}', {len(self.tokens)} tokens)"
+
+
+class UniformLengthSampler:
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.compiled = matcher.compiled
+        self.successors = self._explore()
+        self.ways = self._build_tables()
+
+    def _explore(self):
+        successors = {}
+        stack = [self.matcher.start]
+        while stack:
+            state_id = stack.pop()
+            if state_id in successors:
+                continue
+            successors[state_id] = self.matcher._successors(state_id)
+            stack.extend(target_id for _, target_id in successors[state_id] if target_id not in successors)
+        return successors
+
+    def _build_tables(self):
+        accepting = self.matcher.dfa_accepting
+        size = len(accepting)
+        first = [0] * size
+        for state_id in self.successors:
+            first[state_id] = int(accepting[state_id])
+
+        ways = [first]
+        for _ in range(self.compiled.max_length):
+            following = ways[-1]
+            current = [0] * size
+            for state_id, successors in self.successors.items():
+                current[state_id] = sum(following[target_id] for _, target_id in successors)
+            ways.append(current)
+
+        return ways
+
+    def count(self, length):
+        if length < 0 or length > self.compiled.max_length:
+            return 0
+        return self.ways[length][self.matcher.start]
+
+    def lengths(self):
+        return [length for length, row in enumerate(self.ways) if row[self.matcher.start]]
+
+    def sample(self, length, rng):
+        total = self.count(length)
+        if total == 0:
+            raise ValueError(f"Pattern '{self.compiled.regex}' has no strings of length {length}")
+
+        chars = []
+        state_id = self.matcher.start
+        for remaining in range(length, 0, -1):
+            following = self.ways[remaining - 1]
+            pick = rng.randrange(self.ways[remaining][state_id])
+            for char, target_id in self.successors[state_id]:
+                weight = following[target_id]
+                if pick < weight:
+                    chars.append(char)
+                    state_id = target_id
+                    break
+                pick -= weight
+
+        return ''.join(chars)
+
+
+class PatternMatcher:
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.transitions = []
+        self.epsilon = []
+
+        start = self._new_state()
+        for language in compiled.token_languages:
+            token_end = self._new_state()
+            for values in language.values():
+                for value in values:
+                    state = start
+                    for char in value:
+                        next_state = self.transitions[state].get(char)
+                        if next_state is None:
+                            next_state = self._new_state()
+                            self.transitions[state][char] = next_state
+                        state = next_state
+                    self.epsilon[state].add(token_end)
+            start = token_end
+        self.accept = start
+
+        self.size = None
+        self.dfa_ids = {}
+        self.dfa_states = []
+        self.dfa_transitions = []
+        self.dfa_accepting = []
+        self.start = self._dfa_state(self._closure({0}))
+
+    def _new_state(self):
+        self.transitions.append({})
+        self.epsilon.append(set())
+        return len(self.transitions) - 1
+
+    def _closure(self, states):
+        closure = set(states)
+        stack = list(states)
+        while stack:
+            for target in self.epsilon[stack.pop()]:
+                if target not in closure:
+                    closure.add(target)
+                    stack.append(target)
+        return frozenset(closure)
+
+    def _dfa_state(self, states):
+        state_id = self.dfa_ids.get(states)
+        if state_id is None:
+            state_id = len(self.dfa_states)
+            self.dfa_ids[states] = state_id
+            self.dfa_states.append(states)
+            self.dfa_transitions.append({})
+            self.dfa_accepting.append(self.accept in states)
+        return state_id
+
+    def _step(self, state_id, char):
+        moved = set()
+        for state in self.dfa_states[state_id]:
+            target = self.transitions[state].get(char)
+            if target is not None:
+                moved.add(target)
+        target_id = self._dfa_state(self._closure(moved)) if moved else None
+        self.dfa_transitions[state_id][char] = target_id
+        return target_id
+
+    def _successors(self, state_id):
+        chars = set()
+        for state in self.dfa_states[state_id]:
+            chars.update(self.transitions[state])
+
+        row = self.dfa_transitions[state_id]
+        successors = []
+        for char in sorted(chars):
+            target_id = row[char] if char in row else self._step(state_id, char)
+            successors.append((char, target_id))
+        return successors
+
+    def language_size(self):
+        if self.size is None:
+            counts = {}
+            stack = [(self.start, False)]
+            while stack:
+                state_id, expanded = stack.pop()
+                if state_id in counts:
+                    continue
+                successors = self._successors(state_id)
+                if expanded:
+                    counts[state_id] = int(self.dfa_accepting[state_id]) + sum(
+                        counts[target_id] for _, target_id in successors)
+                else:
+                    stack.append((state_id, True))
+                    stack.extend((target_id, False) for _, target_id in successors if target_id not in counts)
+            self.size = counts[self.start]
+        return self.size
+
+    def enumerate(self):
+        stack = [(self.start, "")]
+        while stack:
+            state_id, prefix = stack.pop()
+            if self.dfa_accepting[state_id]:
+                yield prefix
+            for char, target_id in reversed(self._successors(state_id)):
+                stack.append((target_id, prefix + char))
+
+    def matches(self, s):
+        state_id = self.start
+        transitions = self.dfa_transitions
+        for char in s:
+            row = transitions[state_id]
+            if char in row:
+                state_id = row[char]
+            else:
+                state_id = self._step(state_id, char)
+            if state_id is None:
+                return False
+        return self.dfa_accepting[state_id]
+
+
+class BloomFilter:
+    def __init__(self, capacity, memory_limit):
+        self.size = max(64, memory_limit * 8)
+        self.bits = bytearray(self.size // 8)
+        self.hash_count = min(16, max(1, round(self.size / max(capacity, 1) * math.log(2))))
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class SampleWriter:
+    def __init__(self, output, compress=False, background=False, queue_size=4):
+        self.owns_file = isinstance(output, str)
+        if self.owns_file:
+            self.file = gzip.open(output, 'wt', encoding='utf-8') if compress else open(output, 'w', encoding='utf-8')
+        elif compress:
+            if isinstance(output, io.TextIOBase):
+                if not hasattr(output, 'buffer'):
+                    raise ValueError("compress=True needs a binary stream or a text stream with a .buffer")
+                output.flush()
+                output = output.buffer
+            self.file = gzip.GzipFile(fileobj=output, mode='wb')
+        else:
+            self.file = output
+        self.compressed = compress and not self.owns_file
+        self.binary = self.compressed or not self.owns_file and not isinstance(output, io.TextIOBase)
+        self.output = output
+
+        self.queue = None
+        self.thread = None
+        self.error = None
+        if background:
+            self.queue = queue.Queue(maxsize=queue_size)
+            self.thread = threading.Thread(target=self._drain, daemon=True)
+            self.thread.start()
+
+    def _write_now(self, data):
+        self.file.write(data.encode('utf-8') if self.binary else data)
+
+    def _drain(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is None:
+                try:
+                    self._write_now(data)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, data):
+        if self.queue is None:
+            self._write_now(data)
+            return
+        if self.error is not None:
+            raise self.error
+        self.queue.put(data)
+
+    def close(self):
+        if self.queue is not None:
+            self.queue.put(None)
+            self.thread.join()
+        if self.owns_file:
+            self.file.close()
+        elif self.compressed:
+            self.file.close()
+            self.output.flush()
+        else:
+            self.file.flush()
+        if self.error is not None:
+            raise self.error
+
+
+def spawn_seeds(seed, n):
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(128)
+    seeds = []
+    for i in range(n):
+        digest = hashlib.sha256(f"{seed}:{i}".encode()).digest()
+        seeds.append(int.from_bytes(digest[:16], 'big'))
+    return seeds
+
+
+def _generate_worker(max_repetitions, regex_str, count, seed):
+    generator = CombinationGenerator(max_repetitions, seed=seed)
+    return generator.generate_batch(regex_str, count)
 
 
 class CombinationGenerator:
-    def __init__(self, max_repetitions=5):
+    def __init__(self, max_repetitions=5, seed=None):
         self.max_repetitions = max_repetitions
+        self.rng = random.Random(seed)
         self.steps = []
+        self.compiled_patterns = {}
+        self.samplers = {}
+        self.matchers = {}
+        self.distinct_count = None
 
     def tokenize(self, regex_str):
         self.steps.append(f"1. Tokenizing: '{regex_str}'")
@@ -71,13 +385,7 @@ class CombinationGenerator:
         self.steps.append(f"- Group '{group_token}': alternatives={alternatives}, repetition={rep_type}")
         return alternatives, possible_counts
 
-    def generate_combinations(self, regex_str, count=10, seed=None):
-        if seed is not None:
-            random.seed(seed)
-
-        self.steps = []
-        self.steps.append(f"Processing regex: '{regex_str}'")
-
+    def normalize_regex(self, regex_str):
         normalized_regex = regex_str
         for i in range(2, 10):
             if i == 2:
@@ -86,73 +394,242 @@ class CombinationGenerator:
                 normalized_regex = normalized_regex.replace('³', '3')
             else:
                 normalized_regex = normalized_regex.replace(f'^{i}', str(i))
+        return normalized_regex
+
+    def token_choices(self, token, token_type):
+        if token_type == 'zero_or_more':
+            return [token[0]], range(self.max_repetitions + 1)
+        elif token_type == 'one_or_more':
+            return [token[0]], range(1, self.max_repetitions + 1)
+        elif token_type == 'optional':
+            return [token[0]], range(2)
+        elif token_type == 'repeat':
+            match = re.match(r'([A-Za-z0-9])(\d+)', token)
+            if match:
+                return [match.group(1)], [int(match.group(2))]
+            return [token], [1]
+        elif token_type == 'group':
+            return self.parse_group(token)
+        return [token], [1]
+
+    def compile_pattern(self, regex_str):
+        if regex_str in self.compiled_patterns:
+            return self.compiled_patterns[regex_str]
+
+        tokens = self.tokenize(self.normalize_regex(regex_str))
+        compiled_tokens = []
+        for token, token_type in tokens:
+            alternatives, possible_counts = self.token_choices(token, token_type)
+            compiled_tokens.append((token, list(alternatives), list(possible_counts)))
+
+        compiled = CompiledPattern(regex_str, compiled_tokens)
+        self.compiled_patterns[regex_str] = compiled
+        return compiled
+
+    def get_sampler(self, regex_str):
+        if regex_str not in self.samplers:
+            self.samplers[regex_str] = UniformLengthSampler(self.get_matcher(regex_str))
+        return self.samplers[regex_str]
+
+    def get_matcher(self, regex_str):
+        if regex_str not in self.matchers:
+            self.matchers[regex_str] = PatternMatcher(self.compile_pattern(regex_str))
+        return self.matchers[regex_str]
+
+    def matches(self, regex_str, s):
+        return self.get_matcher(regex_str).matches(s)
+
+    def filter(self, regex_str, strings):
+        matcher = self.get_matcher(regex_str)
+        for s in strings:
+            if matcher.matches(s):
+                yield s
+
+    def language_size(self, regex_str):
+        return self.get_matcher(regex_str).language_size()
+
+    def count_strings(self, regex_str, length):
+        return self.get_sampler(regex_str).count(length)
+
+    def generate_uniform(self, regex_str, length, count=10, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+
+        sampler = self.get_sampler(regex_str)
+        return [sampler.sample(length, self.rng) for _ in range(count)]
+
+    def iter_combinations(self, regex_str, count=None, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+
+        compiled = self.compile_pattern(regex_str)
+        rng = self.rng
+        generated = 0
+        while count is None or generated < count:
+            combination = []
+            for _, alternatives, possible_counts in compiled.tokens:
+                repeat_count = rng.choice(possible_counts) if len(possible_counts) > 1 else possible_counts[0]
+                if repeat_count > 0:
+                    alternative = rng.choice(alternatives) if len(alternatives) > 1 else alternatives[0]
+                    combination.append(alternative * repeat_count)
+            yield ''.join(combination)
+            generated += 1
+
+    def generate_batch(self, regex_str, count=10, seed=None):
+        return list(self.iter_combinations(regex_str, count, seed))
+
+    def write_combinations(self, regex_str, output, count, seed=None, chunk_size=65536, compress=False,
+                           background=False):
+        writer = SampleWriter(output, compress, background)
+        chunk = []
+        written = 0
+        try:
+            for combination in self.iter_combinations(regex_str, count, seed):
+                chunk.append(combination)
+                if len(chunk) >= chunk_size:
+                    writer.write('\n'.join(chunk) + '\n')
+                    written += len(chunk)
+                    chunk = []
+            if chunk:
+                writer.write('\n'.join(chunk) + '\n')
+                written += len(chunk)
+        finally:
+            writer.close()
+
+        return written
+
+    def generate_parallel(self, regex_str, count=10, seed=None, workers=4):
+        self.compile_pattern(regex_str)
+
+        chunk, extra = divmod(count, workers)
+        chunks = [chunk + (1 if i < extra else 0) for i in range(workers)]
+        seeds = spawn_seeds(seed, workers)
+
+        if workers == 1:
+            return _generate_worker(self.max_repetitions, regex_str, chunks[0], seeds[0])
 
-        tokens = self.tokenize(normalized_regex)
         combinations = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_generate_worker, self.max_repetitions, regex_str, size, worker_seed)
+                       for size, worker_seed in zip(chunks, seeds)]
+            for future in futures:
+                combinations.extend(future.result())
+
+        return combinations
+
+    def generate_combinations(self, regex_str, count=10, seed=None, unique=False, memory_limit=None,
+                              max_attempts=None):
+        if seed is not None:
+            self.rng.seed(seed)
+
+        self.steps = []
+        self.steps.append(f"Processing regex: '{regex_str}'")
+
+        tokens = self.tokenize(self.normalize_regex(regex_str))
+
+        if unique:
+            return self._generate_unique(regex_str, count, memory_limit, max_attempts)
 
+        combinations = []
         for i in range(count):
-            combination = []
-            self.steps.append(f"\ncombination #{i + 1}:")
+            combinations.append(self._generate_one(tokens, i))
 
-            for token, token_type in tokens:
-                if token_type == 'literal':
-                    combination.append(token)
-                    self.steps.append(f"- Literal '{token}': added")
-
-                elif token_type == 'zero_or_more':
-                    char = token[0]
-                    rep_count = random.randint(0, self.max_repetitions)
-                    combination.append(char * rep_count)
-                    self.steps.append(f"- '{char}*': using {rep_count} occurrences (repetition = zero or more)")
-
-                elif token_type == 'one_or_more':
-                    char = token[0]
-                    rep_count = random.randint(1, self.max_repetitions)
-                    combination.append(char * rep_count)
-                    self.steps.append(f"- '{char}+': using {rep_count} occurrences")
-
-                elif token_type == 'optional':
-                    char = token[0]
-                    rep_count = random.randint(0, 1)
-                    if rep_count == 1:
-                        combination.append(char)
-                        self.steps.append(f"- '{char}?': included")
-                    else:
-                        self.steps.append(f"- '{char}?': omitted")
-
-                elif token_type == 'repeat':
-                    match = re.match(r'([A-Za-z0-9])(\d+)', token)
-                    if match:
-                        char, count = match.groups()
-                        count = int(count)
-                        combination.append(char * count)
-                        self.steps.append(f"- '{char}{count}': repeated {count} times")
-                    else:
-                        self.steps.append(f"- Failed to parse repeat token: '{token}'")
-                        combination.append(token)
-
-                elif token_type == 'group':
-                    alternatives, possible_counts = self.parse_group(token)
-
-                    repeat_count = random.choice(possible_counts)
-
-                    if repeat_count > 0:
-                        chosen_alternative = random.choice(alternatives)
-                        group_value = chosen_alternative * repeat_count
-                        self.steps.append(
-                            f"- Group '{token}': selected '{chosen_alternative}' repeated {repeat_count} times")
-                    else:
-                        group_value = ""
-                        self.steps.append(f"- Group '{token}': selected 0 repetitions")
-
-                    combination.append(group_value)
-
-            result = ''.join(combination)
+        return combinations
+
+    def _generate_unique(self, regex_str, count, memory_limit, max_attempts):
+        language_size = self.language_size(regex_str)
+        self.steps.append(f"Unique mode: language has {language_size} distinct strings")
+
+        if count >= language_size:
+            combinations = list(self.get_matcher(regex_str).enumerate())
+            self.rng.shuffle(combinations)
+            self.distinct_count = len(combinations)
+            self.steps.append(f"Language exhausted: returning all {self.distinct_count} strings")
+            return combinations
+
+        if max_attempts is None:
+            max_attempts = 100 * count + 1000
+        seen = BloomFilter(count, memory_limit) if memory_limit else set()
+
+        samples = self.iter_combinations(regex_str)
+        combinations = []
+        attempts = 0
+        duplicates = 0
+        while len(combinations) < count and attempts < max_attempts:
+            result = next(samples)
+            attempts += 1
+            if result in seen:
+                duplicates += 1
+                continue
+            seen.add(result)
             combinations.append(result)
-            self.steps.append(f"- Result: '{result}'")
 
+        self.distinct_count = len(combinations)
+        self.steps.append(f"Distinct combinations: {self.distinct_count} after {attempts} attempts "
+                          f"({duplicates} duplicates rejected)")
         return combinations
 
+    def _generate_one(self, tokens, index):
+        combination = []
+        self.steps.append(f"\ncombination #{index + 1}:")
+
+        for token, token_type in tokens:
+            if token_type == 'literal':
+                combination.append(token)
+                self.steps.append(f"- Literal '{token}': added")
+
+            elif token_type == 'zero_or_more':
+                char = token[0]
+                rep_count = self.rng.randint(0, self.max_repetitions)
+                combination.append(char * rep_count)
+                self.steps.append(f"- '{char}*': using {rep_count} occurrences (repetition = zero or more)")
+
+            elif token_type == 'one_or_more':
+                char = token[0]
+                rep_count = self.rng.randint(1, self.max_repetitions)
+                combination.append(char * rep_count)
+                self.steps.append(f"- '{char}+': using {rep_count} occurrences")
+
+            elif token_type == 'optional':
+                char = token[0]
+                rep_count = self.rng.randint(0, 1)
+                if rep_count == 1:
+                    combination.append(char)
+                    self.steps.append(f"- '{char}?': included")
+                else:
+                    self.steps.append(f"- '{char}?': omitted")
+
+            elif token_type == 'repeat':
+                match = re.match(r'([A-Za-z0-9])(\d+)', token)
+                if match:
+                    char, count = match.groups()
+                    count = int(count)
+                    combination.append(char * count)
+                    self.steps.append(f"- '{char}{count}': repeated {count} times")
+                else:
+                    self.steps.append(f"- Failed to parse repeat token: '{token}'")
+                    combination.append(token)
+
+            elif token_type == 'group':
+                alternatives, possible_counts = self.parse_group(token)
+
+                repeat_count = self.rng.choice(possible_counts)
+
+                if repeat_count > 0:
+                    chosen_alternative = self.rng.choice(alternatives)
+                    group_value = chosen_alternative * repeat_count
+                    self.steps.append(
+                        f"- Group '{token}': selected '{chosen_alternative}' repeated {repeat_count} times")
+                else:
+                    group_value = ""
+                    self.steps.append(f"- Group '{token}': selected 0 repetitions")
+
+                combination.append(group_value)
+
+        result = ''.join(combination)
+        self.steps.append(f"- Result: '{result}'")
+        return result
+
     def get_processing_steps(self):
         return self.steps
 
@@ -177,6 +654,28 @@ def main():
         for step in generator.get_processing_steps():
             print(f"  {step}")
 
+        sampler = generator.get_sampler(regex)
+        length = sampler.lengths()[len(sampler.lengths()) // 2]
+        print(f"\nUniform samples of length {length} ({sampler.count(length)} strings):")
+        for combo in generator.generate_uniform(regex, length, count=5):
+            print(f"  - {combo}")
+
+        candidates = combinations + ["", regex, combinations[0] + "X"]
+        print("\nMatching check:")
+        for candidate in candidates:
+            print(f"  - '{candidate}': {generator.matches(regex, candidate)}")
+
+        distinct = generator.generate_combinations(regex, count=20, unique=True)
+        print(f"\nUnique mode: {generator.distinct_count} distinct of {generator.language_size(regex)} possible")
+        print(f"  {', '.join(distinct[:5])}, ...")
+
+        print("\nStreamed to stdout (seed=7):")
+        generator.write_combinations(regex, sys.stdout, count=3, seed=7, background=True)
+
+        print("\nParallel batch (seed=42, 4 workers):")
+        for combo in generator.generate_parallel(regex, count=8, seed=42, workers=4):
+            print(f"  - {combo}")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
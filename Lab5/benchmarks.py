@@ -0,0 +1,213 @@
+import itertools
+import math
+import os
+import random
+import tempfile
+import time
+
+from cyk import CYKParser
+from incremental import IncrementalNormalizer
+from lab5 import ChomskyNormalizer
+
+
+def nullable_chain(n):
+    Vn = [f"A{i}" for i in range(n + 1)]
+    Vt = ["a"]
+    rules = [f"A{i} -> A{i + 1} A{i + 1} | a" for i in range(n)]
+    rules.append(f"A{n} -> ε | a")
+    return Vn, Vt, ", ".join(rules), "A0"
+
+
+def productive_chain(n):
+    Vn = [f"A{i}" for i in range(n + 1)]
+    Vt = ["a", "b"]
+    rules = [f"A{i} -> a A{i + 1} | A{i} b A{i + 1}" for i in range(n)]
+    rules.append(f"A{n} -> b")
+    return Vn, Vt, ", ".join(rules), "A0"
+
+
+def nullable_wide(k):
+    Vn = ["S"] + [f"A{i}" for i in range(k)]
+    Vt = ["a"]
+    rules = ["S -> " + " ".join(f"A{i}" for i in range(k))]
+    rules += [f"A{i} -> a | ε" for i in range(k)]
+    return Vn, Vt, ", ".join(rules), "S"
+
+
+def random_grammar(size=50, rule_length=3, nullable_density=0.1, unit_depth=0, unreachable_fraction=0.0,
+                   rules_per_nonterminal=3, terminals=2, seed=None):
+    rng = random.Random(seed)
+    Vn = [f"A{i}" for i in range(size)]
+    Vt = [chr(ord('a') + i) for i in range(terminals)]
+    reachable = Vn[:max(1, size - int(size * unreachable_fraction))]
+
+    rules = {}
+    for i, left in enumerate(Vn):
+        symbols = Vt + (reachable if left in reachable else Vn)
+        alternatives = [" ".join(rng.choice(Vt) for _ in range(rng.randint(1, rule_length)))]
+        for _ in range(rules_per_nonterminal - 1):
+            length = rng.randint(min(2, rule_length), rule_length)
+            alternatives.append(" ".join(rng.choice(symbols) for _ in range(length)))
+        if rng.random() < nullable_density:
+            alternatives.append("ε")
+        if i < min(unit_depth, len(reachable) - 1):
+            alternatives.append(Vn[i + 1])
+        rules[left] = alternatives
+
+    P = ", ".join(f"{left} -> {' | '.join(alternatives)}" for left, alternatives in rules.items())
+    return Vn, Vt, P, "A0"
+
+
+def benchmark_scaling(parameter, values, method='polynomial', seed=0, slope_alert=3.0, **fixed):
+    print(f"scaling {parameter} ({method}, seed={seed}, {fixed or 'defaults'}):")
+    legend = None
+    previous = None
+    for value in values:
+        normalizer = ChomskyNormalizer(*random_grammar(**{**fixed, parameter: value}, seed=seed))
+        normalizer.normalize(method, verbose=False, metrics=True)
+        phases = normalizer.metrics.phases
+        total = normalizer.metrics.total_seconds
+
+        if legend is None:
+            legend = [phase.phase for phase in phases]
+            print("  phases: " + ", ".join(f"{i + 1}={title}" for i, title in enumerate(legend)))
+            print(f"  {parameter:>20} | " + " | ".join(f"{f'{i + 1} (s)':>8}" for i in range(len(legend))) +
+                  f" | {'total (s)':>9} | {'rules':>7} | {'slope':>5}")
+
+        slope = ''
+        if previous is not None and previous[0] > 0 and value > previous[0] and previous[1] > 0:
+            exponent = math.log(total / previous[1]) / math.log(value / previous[0])
+            slope = f"{exponent:.1f}" + (" !" if exponent > slope_alert else "")
+        previous = (value, total)
+
+        print(f"  {value:>20} | " + " | ".join(f"{phase.seconds:>8.4f}" for phase in phases) +
+              f" | {total:>9.4f} | {phases[-1].rules:>7} | {slope:>5}")
+    print()
+
+
+def benchmark_random_grammars():
+    benchmark_scaling('size', (50, 100, 200, 400, 800))
+    benchmark_scaling('rule_length', (2, 4, 8, 16, 32), size=50)
+    benchmark_scaling('nullable_density', (0.1, 0.2, 0.4, 0.8), size=100)
+    benchmark_scaling('unit_depth', (10, 50, 100, 200, 400), size=400)
+    benchmark_scaling('unreachable_fraction', (0.1, 0.3, 0.5, 0.7, 0.9), size=400)
+    benchmark_scaling('rule_length', (2, 3, 4, 5, 6), method='classic', size=30, nullable_density=0.8)
+
+
+def _language(grammar, method, max_length):
+    normalizer = ChomskyNormalizer(*grammar)
+    try:
+        normalizer.normalize(method, verbose=False)
+    except ValueError:
+        return None
+    parser = CYKParser(normalizer)
+    return {word for length in range(max_length + 1)
+            for word in itertools.product(grammar[1], repeat=length) if parser.recognize(word)}
+
+
+def verify_methods(count=600, max_length=6, size=6, nullable_density=0.4, seed=0):
+    mismatches = []
+    for i in range(count):
+        grammar = random_grammar(size=size, nullable_density=nullable_density, unit_depth=2, seed=seed + i)
+        classic = _language(grammar, 'classic', max_length)
+        polynomial = _language(grammar, 'polynomial', max_length)
+        source = ChomskyNormalizer(*grammar)
+        generates_empty = source.S in source._derivable_symbols(set())
+        if classic is None or polynomial is None:
+            matches = classic is polynomial
+        else:
+            # the classic path yields L - {ε}; the polynomial path keeps S0 -> ε
+            matches = classic - {()} == polynomial - {()} and (() in polynomial) == generates_empty
+        if not matches:
+            mismatches.append(seed + i)
+    print(f"classic vs polynomial on {count} random grammars, words up to length {max_length}: "
+          f"{len(mismatches)} mismatches{f' (seeds {mismatches[:10]})' if mismatches else ''}")
+    return not mismatches
+
+
+def time_phase(grammar, phase):
+    normalizer = ChomskyNormalizer(*grammar)
+    start = time.perf_counter()
+    getattr(normalizer, phase)()
+    return time.perf_counter() - start
+
+
+def benchmark_chains(sizes=(500, 1000, 2000, 4000, 8000)):
+    print(f"{'chain length':>12} | {'nullable (s)':>12} | {'productive (s)':>14}")
+    for n in sizes:
+        nullable_time = time_phase(nullable_chain(n), 'eliminate_epsilons')
+        productive_time = time_phase(productive_chain(n), 'eliminate_nonproductive_symbols')
+        print(f"{n:>12} | {nullable_time:>12.4f} | {productive_time:>14.4f}")
+
+
+def benchmark_epsilon_blowup(widths=(4, 8, 12, 14, 16)):
+    print(f"{'nullable width':>14} | {'classic rules':>13} | {'classic (s)':>11} | "
+          f"{'polynomial rules':>16} | {'polynomial (s)':>14}")
+    for k in widths:
+        row = []
+        for method in ('classic', 'polynomial'):
+            normalizer = ChomskyNormalizer(*nullable_wide(k))
+            start = time.perf_counter()
+            normalizer.normalize(method, verbose=False)
+            row.append((sum(len(rules) for rules in normalizer.P.values()), time.perf_counter() - start))
+        (classic_rules, classic_time), (poly_rules, poly_time) = row
+        print(f"{k:>14} | {classic_rules:>13} | {classic_time:>11.4f} | {poly_rules:>16} | {poly_time:>14.4f}")
+
+
+def benchmark_file_loading(sizes=(10000, 50000, 100000)):
+    print(f"{'rules':>8} | {'load (s)':>8}")
+    for n in sizes:
+        with tempfile.NamedTemporaryFile('w', suffix='.cfg', delete=False, encoding='utf-8') as f:
+            for i in range(n):
+                f.write(f"A{i % 1000} -> a A{(i + 1) % 1000} , | b A{i % 7} | ε\n")
+            path = f.name
+        try:
+            start = time.perf_counter()
+            ChomskyNormalizer.from_file(path)
+            print(f"{n:>8} | {time.perf_counter() - start:>8.4f}")
+        finally:
+            os.remove(path)
+
+
+def benchmark_incremental_edit(sizes=(500, 1000, 2000, 4000)):
+    print(f"{'chain length':>12} | {'full (s)':>8} | {'add_rule (s)':>12} | {'remove_rule (s)':>15}")
+    for n in sizes:
+        grammar = productive_chain(n)
+        full = ChomskyNormalizer(*grammar)
+        start = time.perf_counter()
+        full.normalize('polynomial', verbose=False)
+        full_time = time.perf_counter() - start
+
+        normalizer = IncrementalNormalizer(*grammar)
+        start = time.perf_counter()
+        normalizer.add_rule(f"A{n // 2} -> b a b")
+        add_time = time.perf_counter() - start
+        start = time.perf_counter()
+        normalizer.remove_rule(f"A{n // 2} -> b a b")
+        remove_time = time.perf_counter() - start
+        print(f"{n:>12} | {full_time:>8.4f} | {add_time:>12.4f} | {remove_time:>15.4f}")
+
+
+def benchmark_phase_metrics(width=12):
+    for method in ('classic', 'polynomial'):
+        normalizer = ChomskyNormalizer(*nullable_wide(width))
+        normalizer.normalize(method, verbose=False, metrics=True)
+        print(f"{method} normalization of nullable width {width}:")
+        print(normalizer.metrics)
+        print()
+
+
+if __name__ == "__main__":
+    benchmark_chains()
+    print()
+    benchmark_epsilon_blowup()
+    print()
+    benchmark_file_loading()
+    print()
+    benchmark_incremental_edit()
+    print()
+    benchmark_phase_metrics()
+    print()
+    verify_methods()
+    print()
+    benchmark_random_grammars()
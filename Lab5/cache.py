@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+
+from lab5 import ChomskyNormalizer
+
+
+CACHE_VERSION = 1
+
+
+def grammar_key(normalizer, method):
+    symbols = normalizer.symbols
+    canonical = {
+        'version': CACHE_VERSION,
+        'method': method,
+        'Vn': sorted(symbols[sym] for sym in normalizer.Vn),
+        'Vt': sorted(symbols[sym] for sym in normalizer.Vt),
+        'P': sorted((symbols[left], sorted([symbols[sym] for sym in rule] for rule in rules))
+                    for left, rules in normalizer.P.items()),
+        'S': symbols[normalizer.S],
+    }
+    encoded = json.dumps(canonical, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def dump_normalizer(normalizer):
+    state = {
+        'symbols': normalizer.symbols,
+        'Vn': sorted(normalizer.Vn),
+        'Vt': sorted(normalizer.Vt),
+        'P': [[left, rules] for left, rules in normalizer.P.items()],
+        'S': normalizer.S,
+        'original_S': normalizer.original_S,
+        'terminal_map': sorted(normalizer.terminal_map.items()),
+        'pair_map': [[pair, sym] for pair, sym in normalizer.pair_map.items()],
+        'new_nonterm_counter': normalizer.new_nonterm_counter,
+    }
+    return zlib.compress(json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def load_normalizer(data):
+    state = json.loads(zlib.decompress(data).decode('utf-8'))
+    normalizer = ChomskyNormalizer.__new__(ChomskyNormalizer)
+    normalizer.symbols = state['symbols']
+    normalizer.symbol_ids = {name: sym for sym, name in enumerate(normalizer.symbols)}
+    normalizer.Vn = set(state['Vn'])
+    normalizer.Vt = set(state['Vt'])
+    normalizer.P = {left: [tuple(rule) for rule in rules] for left, rules in state['P']}
+    normalizer.S = state['S']
+    normalizer.original_S = state['original_S']
+    normalizer.terminal_map = dict(state['terminal_map'])
+    normalizer.pair_map = OrderedDict((tuple(pair), sym) for pair, sym in state['pair_map'])
+    normalizer.new_nonterm_counter = state['new_nonterm_counter']
+    normalizer.metrics = None
+    return normalizer
+
+
+class GrammarCache:
+    SUFFIX = '.cnf'
+    TEMP_PREFIX = '.tmp-'
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, stale_seconds=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            normalizer = load_normalizer(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, zlib.error):
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return normalizer
+
+    def put(self, key, normalizer):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=self.TEMP_PREFIX, suffix=self.SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(dump_normalizer(normalizer))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def normalize(self, Vn, Vt, P, S, method='classic'):
+        normalizer = ChomskyNormalizer(Vn, Vt, P, S)
+        key = grammar_key(normalizer, method)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        normalizer.normalize(method, verbose=False)
+        self.put(key, normalizer)
+        return normalizer
+
+    def _entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path, name.startswith(self.TEMP_PREFIX)))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _, _ in self._entries())
+
+    def _live_entries(self):
+        stale_before = time.time() - self.stale_seconds
+        entries = []
+        for entry in self._entries():
+            mtime, _, path, temporary = entry
+            if temporary and mtime < stale_before:
+                self._remove(path)
+            else:
+                entries.append(entry)
+        return entries
+
+    def evict(self):
+        entries = self._live_entries()
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, path, temporary in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if not temporary:
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        for _, _, path, temporary in self._live_entries():
+            if not temporary:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    Vn = ["S", "A", "B", "C", "E"]
+    Vt = ["a", "b"]
+    P = "S -> b A C | B, A -> a | a S | b C a C b, B -> A C | b S | a A a, C -> ε | A B, E -> B A"
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = GrammarCache(directory)
+        for attempt in range(2):
+            start = time.perf_counter()
+            normalizer = cache.normalize(Vn, Vt, P, "S")
+            print(f"attempt {attempt + 1}: {time.perf_counter() - start:.4f}s "
+                  f"(hits={cache.hits}, misses={cache.misses}, size={cache.size()} bytes)")
+        print(normalizer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+from lab5 import ChomskyNormalizer, bits
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CYKParser:
+    def __init__(self, normalizer, use_numpy=None):
+        if use_numpy and np is None:
+            raise ValueError("NumPy is not installed")
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.normalizer = normalizer
+        self.nonterminals = sorted(normalizer.P)
+        self.bit_of = {nt: i for i, nt in enumerate(self.nonterminals)}
+        self.names = [normalizer.symbols[nt] for nt in self.nonterminals]
+        self.start_mask = 1 << self.bit_of[normalizer.S] if normalizer.S in self.bit_of else 0
+        self.accepts_empty = () in normalizer.P.get(normalizer.S, [])
+
+        self.terminal_masks = {}
+        self.pair_lhs = {}
+        self.right_masks = {}
+        for left, rules in normalizer.P.items():
+            left_bit = 1 << self.bit_of[left]
+            for rule in rules:
+                if len(rule) == 1:
+                    terminal = normalizer.symbols[rule[0]]
+                    self.terminal_masks[terminal] = self.terminal_masks.get(terminal, 0) | left_bit
+                elif len(rule) == 2:
+                    if rule[0] not in self.bit_of or rule[1] not in self.bit_of:
+                        continue
+                    b, c = self.bit_of[rule[0]], self.bit_of[rule[1]]
+                    lhs_by_right = self.pair_lhs.setdefault(b, {})
+                    lhs_by_right[1 << c] = lhs_by_right.get(1 << c, 0) | left_bit
+                    self.right_masks[b] = self.right_masks.get(b, 0) | (1 << c)
+
+        self.left_mask = 0
+        for b in self.right_masks:
+            self.left_mask |= 1 << b
+
+        self.binary = {b: [(c, list(bits(self.pair_lhs[b][1 << c]))) for c in bits(right)]
+                       for b, right in self.right_masks.items()}
+        if self.use_numpy:
+            triples = sorted((a, b, c) for b, pairs in self.binary.items() for c, lhs in pairs for a in lhs)
+            self.rule_lhs, self.rule_left, self.rule_right = np.array(triples, dtype=np.intp).reshape(-1, 3).T.copy()
+
+    @staticmethod
+    def _tokens(tokens):
+        if isinstance(tokens, str):
+            return tokens.split() if ' ' in tokens else list(tokens)
+        return list(tokens)
+
+    def _spans_numpy(self, tokens):
+        n = len(tokens)
+        m = len(self.nonterminals)
+        by_start = np.zeros((m, max(n, 1) + 1, n), dtype=bool)
+        by_end = np.zeros((m, n + 1, n + 1), dtype=bool)
+        for i, token in enumerate(tokens):
+            for a in bits(self.terminal_masks.get(token, 0)):
+                by_start[a, 1, i] = by_end[a, 1, i + 1] = True
+
+        targets, starts = np.unique(self.rule_lhs, return_index=True)
+        rule_left, rule_right = self.rule_left, self.rule_right
+        for length in range(2, n + 1):
+            width = n - length + 1
+            left = by_start[rule_left, 1:length, :width]
+            right = by_end[rule_right, length - 1:0:-1, length:]
+            matched = (left & right).any(axis=1)
+            if not len(targets) or not matched.any():
+                continue
+            row = np.logical_or.reduceat(matched, starts, axis=0)
+            by_start[targets, length, :width] = row
+            by_end[targets, length, length:] = row
+
+        return [None] + [by_start[:, length, :n - length + 1] for length in range(1, max(n, 1) + 1)]
+
+    def spans(self, tokens):
+        tokens = self._tokens(tokens)
+        if self.use_numpy:
+            return [None] + [[int.from_bytes(np.packbits(cells, bitorder='little').tobytes(), 'little')
+                              for cells in row] for row in self._spans_numpy(tokens)[1:]]
+        n = len(tokens)
+        first = [0] * len(self.nonterminals)
+        for i, token in enumerate(tokens):
+            for a in bits(self.terminal_masks.get(token, 0)):
+                first[a] |= 1 << i
+        rows = [None, first]
+
+        binary = self.binary
+        active = [None, [b for b in binary if first[b]]]
+        for length in range(2, n + 1):
+            row = [0] * len(self.nonterminals)
+            for k in range(1, length):
+                left_row = rows[k]
+                right_row = rows[length - k]
+                for b in active[k]:
+                    left = left_row[b]
+                    for c, lhs in binary[b]:
+                        right = right_row[c]
+                        if right:
+                            matched = left & (right >> k)
+                            if matched:
+                                for a in lhs:
+                                    row[a] |= matched
+            rows.append(row)
+            active.append([b for b in binary if row[b]])
+
+        return rows
+
+    def chart(self, tokens):
+        rows = self.spans(tokens)
+        n = len(rows) - 1
+        chart = [None]
+        for length in range(1, n + 1):
+            cells = [0] * (n - length + 1)
+            for a, row in enumerate(rows[length]):
+                for i in bits(row):
+                    cells[i] |= 1 << a
+            chart.append(cells)
+
+        return chart
+
+    def recognize(self, tokens):
+        tokens = self._tokens(tokens)
+        if not tokens:
+            return self.accepts_empty
+        if not self.start_mask:
+            return False
+        if self.use_numpy:
+            return bool(self._spans_numpy(tokens)[len(tokens)][self.bit_of[self.normalizer.S], 0])
+        return bool(self.spans(tokens)[len(tokens)][self.bit_of[self.normalizer.S]] & 1)
+
+    def forest(self, tokens):
+        tokens = self._tokens(tokens)
+        n = len(tokens)
+        if n == 0 or not self.start_mask:
+            return None, {}
+
+        chart = self.chart(tokens)
+        if not chart[n][0] & self.start_mask:
+            return None, {}
+
+        root = (0, n, self.bit_of[self.normalizer.S])
+        forest = {}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node in forest:
+                continue
+            i, length, a = node
+            a_bit = 1 << a
+            alternatives = []
+            if length == 1:
+                alternatives.append((tokens[i],))
+            else:
+                for k in range(1, length):
+                    left = chart[k][i] & self.left_mask
+                    right = chart[length - k][i + k]
+                    for b in bits(left):
+                        for c in bits(right & self.right_masks[b]):
+                            if self.pair_lhs[b][1 << c] & a_bit:
+                                children = ((i, k, b), (i + k, length - k, c))
+                                alternatives.append(children)
+                                stack.extend(child for child in children if child not in forest)
+            forest[node] = alternatives
+
+        return root, forest
+
+    def parse_tree(self, tokens):
+        root, forest = self.forest(tokens)
+        if root is None:
+            return None
+
+        trees = {}
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in trees:
+                continue
+            children = forest[node][0]
+            if len(children) == 1:
+                trees[node] = (self.names[node[2]], [children[0]])
+            elif expanded:
+                trees[node] = (self.names[node[2]], [trees[child] for child in children])
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children if child not in trees)
+
+        return trees[root]
+
+
+def format_tree(tree):
+    lines = []
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, str):
+            lines.append("  " * depth + repr(node))
+            continue
+        name, children = node
+        lines.append("  " * depth + name)
+        for child in reversed(children):
+            stack.append((child, depth + 1))
+    return '\n'.join(lines)
+
+
+def main():
+    Vn = ["S", "A", "B", "C", "E"]
+    Vt = ["a", "b"]
+    P = "S -> b A C | B, A -> a | a S | b C a C b, B -> A C | b S | a A a, C -> ε | A B, E -> B A"
+
+    normalizer = ChomskyNormalizer(Vn, Vt, P, "S")
+    normalizer.normalize(verbose=False)
+    parser = CYKParser(normalizer)
+
+    for word in ["a", "ba", "aba", "bab", "aaa", "baab", "abba"]:
+        print(f"'{word}': {parser.recognize(word)}")
+
+    print("\nParse tree for 'aaa':")
+    print(format_tree(parser.parse_tree("aaa")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+from cyk import format_tree
+from lab5 import ChomskyNormalizer
+
+
+class EarleyParser:
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.rule_lhs = []
+        self.rule_rhs = []
+        self.rules_by_lhs = {}
+        for left, rules in grammar.P.items():
+            for rule in rules:
+                self.rules_by_lhs.setdefault(left, []).append(len(self.rule_lhs))
+                self.rule_lhs.append(left)
+                self.rule_rhs.append(rule)
+
+        self.start_rule = len(self.rule_lhs)
+        self.rule_lhs.append(-1)
+        self.rule_rhs.append((grammar.S,))
+
+        self.nonterminals = set(grammar.P) | grammar.Vn
+        self.nullable = grammar._derivable_symbols(set())
+        self.empty_trees = self._empty_trees()
+        self.symbol_ids = grammar.symbol_ids
+
+    def _empty_trees(self):
+        trees = {}
+        changed = True
+        while changed:
+            changed = False
+            for rule_id, rhs in enumerate(self.rule_rhs[:self.start_rule]):
+                left = self.rule_lhs[rule_id]
+                if left not in trees and all(sym in trees for sym in rhs):
+                    trees[left] = (self.grammar.symbols[left], [trees[sym] for sym in rhs])
+                    changed = True
+        return trees
+
+    def _tokens(self, tokens):
+        if isinstance(tokens, str):
+            tokens = tokens.split() if ' ' in tokens else list(tokens)
+        return [self.symbol_ids.get(token, -1) for token in tokens]
+
+    def _leo_item(self, j, sym, items_waiting, leo_cache):
+        chain = []
+        visited = set()
+        top = None
+        while True:
+            key = (j, sym)
+            if key in leo_cache:
+                if leo_cache[key] is not None:
+                    top = leo_cache[key]
+                break
+            waiting = items_waiting[j].get(sym, ())
+            if len(waiting) != 1 or key in visited:
+                leo_cache[key] = None
+                break
+            rule_id, dot, origin = waiting[0]
+            if dot + 1 != len(self.rule_rhs[rule_id]):
+                leo_cache[key] = None
+                break
+            visited.add(key)
+            chain.append(key)
+            top = (rule_id, dot + 1, origin)
+            j, sym = origin, self.rule_lhs[rule_id]
+
+        for key in chain:
+            leo_cache[key] = top
+        return top
+
+    def chart(self, tokens, leo=False):
+        tokens = self._tokens(tokens)
+        n = len(tokens)
+        rule_rhs = self.rule_rhs
+        rule_lhs = self.rule_lhs
+        nonterminals = self.nonterminals
+        nullable = self.nullable
+
+        seen = [set() for _ in range(n + 1)]
+        completed = [{} for _ in range(n + 1)]
+        seen[0].add((self.start_rule, 0, 0))
+        items = [list(seen[0])] + [[] for _ in range(n)]
+        items_waiting = []
+        leo_cache = {}
+        leo_completions = [[] for _ in range(n + 1)]
+
+        for i in range(n + 1):
+            current_items = items[i]
+            current_seen = seen[i]
+            waiting = {}
+            predicted = set()
+
+            k = 0
+            while k < len(current_items):
+                item = current_items[k]
+                k += 1
+                rule_id, dot, origin = item
+                rhs = rule_rhs[rule_id]
+
+                if dot < len(rhs):
+                    sym = rhs[dot]
+                    waiting.setdefault(sym, []).append(item)
+                    if sym in nonterminals:
+                        if sym not in predicted:
+                            predicted.add(sym)
+                            for predicted_rule in self.rules_by_lhs.get(sym, ()):
+                                new_item = (predicted_rule, 0, i)
+                                if new_item not in current_seen:
+                                    current_seen.add(new_item)
+                                    current_items.append(new_item)
+                        if sym in nullable:
+                            new_item = (rule_id, dot + 1, origin)
+                            if new_item not in current_seen:
+                                current_seen.add(new_item)
+                                current_items.append(new_item)
+                else:
+                    left = rule_lhs[rule_id]
+                    completed[i].setdefault((left, origin), []).append(rule_id)
+                    if origin == i:
+                        continue
+                    if leo:
+                        top = self._leo_item(origin, left, items_waiting, leo_cache)
+                        if top is not None:
+                            leo_completions[i].append((left, origin))
+                            if top not in current_seen:
+                                current_seen.add(top)
+                                current_items.append(top)
+                            continue
+                    for waiting_rule, waiting_dot, waiting_origin in items_waiting[origin].get(left, ()):
+                        new_item = (waiting_rule, waiting_dot + 1, waiting_origin)
+                        if new_item not in current_seen:
+                            current_seen.add(new_item)
+                            current_items.append(new_item)
+
+            items_waiting.append(waiting)
+
+            if i < n:
+                next_seen = seen[i + 1]
+                for waiting_rule, waiting_dot, waiting_origin in waiting.get(tokens[i], ()):
+                    new_item = (waiting_rule, waiting_dot + 1, waiting_origin)
+                    if new_item not in next_seen:
+                        next_seen.add(new_item)
+                        items[i + 1].append(new_item)
+
+        return tokens, seen, completed, items_waiting, leo_completions
+
+    def recognize(self, tokens):
+        tokens, seen = self.chart(tokens, leo=True)[:2]
+        return (self.start_rule, 1, 0) in seen[len(tokens)]
+
+    def parse_tree(self, tokens):
+        tokens, seen, completed, items_waiting, leo_completions = self.chart(tokens, leo=True)
+        n = len(tokens)
+        if (self.start_rule, 1, 0) not in seen[n]:
+            return None
+
+        item_positions = {}
+        for position, items in enumerate(seen):
+            for item in items:
+                item_positions.setdefault(item, []).append(position)
+        by_origin = {}
+        leo_cursors = {}
+        walked = {}
+
+        def spans_at(end, start):
+            origins = by_origin.get(end)
+            if origins is None:
+                origins = by_origin[end] = {}
+                for left, origin in completed[end]:
+                    origins.setdefault(origin, []).append(left)
+                leo_cursors[end] = [(origin, left) for left, origin in leo_completions[end]]
+                walked[end] = end + 1
+            if start < walked[end]:
+                cursors = []
+                for key in leo_cursors[end]:
+                    key = self._walk_leo(key, start, completed[end], origins, items_waiting)
+                    if key is not None:
+                        cursors.append(key)
+                leo_cursors[end] = cursors
+                walked[end] = start
+            return origins.get(start, [])
+
+        symbols = self.grammar.symbols
+        span_choices = {}
+        trees = {}
+        stack = [((self.grammar.S, 0, n), False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in trees:
+                continue
+            left, start, end = node
+            if start == end:
+                trees[node] = self.empty_trees[left]
+                continue
+
+            choices = span_choices.get((start, end))
+            if choices is None:
+                choices = self._span_derivations(start, end, tokens, seen, completed, item_positions, spans_at)
+                span_choices[(start, end)] = choices
+            children = choices[left]
+
+            if expanded:
+                trees[node] = (symbols[left], [trees[child] if isinstance(child, tuple) else symbols[child]
+                                               for child in children])
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children if isinstance(child, tuple) and child not in trees)
+
+        return trees[(self.grammar.S, 0, n)]
+
+    def _walk_leo(self, key, start, completed, origins, items_waiting):
+        j, sym = key
+        while j >= start:
+            waiting = items_waiting[j].get(sym, ())
+            if len(waiting) != 1:
+                return None
+            rule_id, dot, origin = waiting[0]
+            if dot + 1 != len(self.rule_rhs[rule_id]):
+                return None
+            left = self.rule_lhs[rule_id]
+            rules = completed.setdefault((left, origin), [])
+            if rule_id in rules:
+                return None
+            if not rules:
+                origins.setdefault(origin, []).append(left)
+            rules.append(rule_id)
+            j, sym = origin, left
+        return j, sym
+
+    def _span_derivations(self, start, end, tokens, seen, completed, item_positions, spans_at):
+        chosen = {}
+        pending = spans_at(end, start)
+        progress = True
+        while pending and progress:
+            progress = False
+            remaining = []
+            for left in pending:
+                for rule_id in completed[end][(left, start)]:
+                    children = self._split(rule_id, len(self.rule_rhs[rule_id]) - 1, start, end, end,
+                                           chosen, tokens, seen, completed, item_positions, spans_at)
+                    if children is not None:
+                        chosen[left] = children
+                        progress = True
+                        break
+                else:
+                    remaining.append(left)
+            pending = remaining
+        return chosen
+
+    def _split(self, rule_id, m, start, end, e, resolved, tokens, seen, completed, item_positions, spans_at):
+        if m < 0:
+            return [] if e == start else None
+
+        sym = self.rule_rhs[rule_id][m]
+        if sym not in self.nonterminals:
+            if e <= start or tokens[e - 1] != sym or (rule_id, m, start) not in seen[e - 1]:
+                return None
+            rest = self._split(rule_id, m - 1, start, end, e - 1, resolved, tokens, seen, completed,
+                               item_positions, spans_at)
+            return None if rest is None else rest + [sym]
+
+        spans_at(e, start)
+        completed_at = completed[e]
+        for s in item_positions.get((rule_id, m, start), ()):
+            if s > e:
+                break
+            if s == e:
+                if sym not in self.nullable:
+                    continue
+            elif (sym, s) not in completed_at:
+                continue
+            if (s, e) == (start, end) and sym not in resolved:
+                continue
+            rest = self._split(rule_id, m - 1, start, end, s, resolved, tokens, seen, completed,
+                               item_positions, spans_at)
+            if rest is not None:
+                return rest + [(sym, s, e)]
+        return None
+
+
+def main():
+    Vn = ["S", "A", "B", "C", "E"]
+    Vt = ["a", "b"]
+    P = "S -> b A C | B, A -> a | a S | b C a C b, B -> A C | b S | a A a, C -> ε | A B, E -> B A"
+
+    parser = EarleyParser(ChomskyNormalizer(Vn, Vt, P, "S"))
+    for word in ["a", "ba", "aba", "bab", "aaa", "baab", "abba"]:
+        print(f"'{word}': {parser.recognize(word)}")
+
+    print("\nParse tree for 'bab':")
+    print(format_tree(parser.parse_tree("bab")))
+
+
+if __name__ == "__main__":
+    main()
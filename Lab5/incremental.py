@@ -0,0 +1,387 @@
+import copy
+import itertools
+
+from cyk import CYKParser
+from lab5 import ChomskyNormalizer, bits
+
+
+class IncrementalNormalizer(ChomskyNormalizer):
+    def __init__(self, Vn, Vt, P, S):
+        super().__init__(Vn, Vt, P, S)
+        self.source = {left: dict.fromkeys(rules) for left, rules in self.P.items()}
+        self.Vn |= set(self.source)
+        self.Vt |= {sym for rules in self.source.values() for rule in rules for sym in rule} - self.Vn
+        self.S = self._get_new_nonterminal('S')
+        self.rebuild()
+
+    def _reset(self):
+        self.bin_rules = {}
+        self.occurrences = {}
+        self.nullable = set()
+        self.variants = {}
+        self.del_rules = {}
+        self.unit_edges = {}
+        self.unit_preds = {}
+        self.reach = {}
+        self.closed = {}
+        self.closed_occurrences = {}
+        self.productive = set()
+        self.witness = {}
+        self.reachable = set()
+        self.P = {}
+
+    def _binarize(self, left, rule):
+        if len(rule) <= 1:
+            return [(left, rule)]
+
+        rules = []
+        symbols = []
+        for sym in rule:
+            if sym in self.Vt:
+                helper = self.terminal_map.get(sym)
+                if helper is None:
+                    helper = self._get_new_nonterminal('T')
+                    self.terminal_map[sym] = helper
+                rules.append((helper, (sym,)))
+                sym = helper
+            symbols.append(sym)
+
+        current = symbols[0]
+        for sym in symbols[1:-1]:
+            pair = (current, sym)
+            helper = self.pair_map.get(pair)
+            if helper is None:
+                helper = self._get_new_nonterminal('N')
+                self.pair_map[pair] = helper
+            rules.append((helper, pair))
+            current = helper
+        rules.append((left, (current, symbols[-1])))
+        return rules
+
+    def _count_rule(self, left, rule, delta, changed):
+        rules = self.bin_rules.setdefault(left, {})
+        old = rules.get(rule, 0)
+        new = old + delta
+        key = (left, rule)
+        if new:
+            rules[rule] = new
+        else:
+            del rules[rule]
+            if not rules:
+                del self.bin_rules[left]
+
+        if old == 0:
+            for sym in set(rule):
+                self.occurrences.setdefault(sym, set()).add(key)
+            changed.add(key)
+        elif new == 0:
+            for sym in set(rule):
+                self.occurrences[sym].discard(key)
+            changed.add(key)
+
+    def _variants(self, rule):
+        if len(rule) == 2:
+            first, second = rule
+            variants = [rule]
+            if second in self.nullable:
+                variants.append((first,))
+            if first in self.nullable:
+                variants.append((second,))
+            return tuple(dict.fromkeys(variants))
+        return (rule,) if rule else ()
+
+    def _count_variant(self, left, rule, delta):
+        rules = self.del_rules.setdefault(left, {})
+        old = rules.get(rule, 0)
+        new = old + delta
+        if new:
+            rules[rule] = new
+        else:
+            del rules[rule]
+            if not rules:
+                del self.del_rules[left]
+        return old == 0 or new == 0
+
+    def _closure_rules(self, left):
+        rules = {}
+        for sym in bits(self.reach[left]):
+            for rule in self.del_rules.get(sym, ()):
+                if not self._is_unit(rule):
+                    rules[rule] = None
+        if left == self.S and left in self.nullable:
+            rules[()] = None
+        return rules
+
+    def _unit_ancestors(self, lefts):
+        found = set(lefts)
+        stack = list(found)
+        while stack:
+            for pred in self.unit_preds.get(stack.pop(), ()):
+                if pred not in found:
+                    found.add(pred)
+                    stack.append(pred)
+        return found
+
+    def _toggle_unit_edge(self, left, target):
+        if (target,) in self.del_rules.get(left, ()):
+            self.unit_edges.setdefault(left, set()).add(target)
+            self.unit_preds.setdefault(target, set()).add(left)
+        else:
+            self.unit_edges[left].discard(target)
+            self.unit_preds[target].discard(left)
+
+    def _refresh(self, dirty, flipped):
+        changed_lefts = set()
+        unit_seeds = set()
+        for key in dirty:
+            left, rule = key
+            new = self._variants(rule) if rule in self.bin_rules.get(left, ()) else ()
+            old = self.variants.pop(key, ())
+            if new:
+                self.variants[key] = new
+
+            toggled = [v for v in old if v not in new and self._count_variant(left, v, -1)]
+            toggled += [v for v in new if v not in old and self._count_variant(left, v, 1)]
+            for v in toggled:
+                if (left in self.reach) != (left in self.del_rules):
+                    unit_seeds.add(left)
+                if self._is_unit(v):
+                    self._toggle_unit_edge(left, v[0])
+                    unit_seeds.add(left)
+                else:
+                    changed_lefts.add(left)
+
+        affected = set()
+        if unit_seeds:
+            stale = self._unit_ancestors(unit_seeds)
+            old_reach = {left: self.reach.pop(left) for left in stale if left in self.reach}
+            graph = {left: list(self.unit_edges.get(left, ())) for left in stale if left in self.del_rules}
+            component_of, reaches = self._unit_components(graph, self.reach)
+            for left in graph:
+                self.reach[left] = reaches[component_of[left]]
+                if old_reach.get(left) != self.reach[left]:
+                    affected.add(left)
+            affected |= old_reach.keys() - graph.keys()
+
+        if changed_lefts:
+            affected |= self._unit_ancestors(changed_lefts)
+        if self.S in flipped:
+            affected.add(self.S)
+
+        changed = set()
+        shrunk = set()
+        for left in affected:
+            rules = self._closure_rules(left) if left in self.reach else {}
+            self._set_closed(left, rules, changed, shrunk)
+
+        self._eliminate_useless_closed(changed, shrunk)
+
+    def _set_closed(self, left, rules, changed, shrunk):
+        old = self.closed.get(left, {})
+        if rules:
+            self.closed[left] = rules
+        else:
+            self.closed.pop(left, None)
+
+        for rule in old:
+            if rule not in rules:
+                for sym in set(rule):
+                    self.closed_occurrences[sym].discard((left, rule))
+                changed.add(left)
+                shrunk.add(left)
+        for rule in rules:
+            if rule not in old:
+                for sym in set(rule):
+                    self.closed_occurrences.setdefault(sym, set()).add((left, rule))
+                changed.add(left)
+
+    def _useful(self, rule):
+        return all(sym in self.Vt or sym in self.productive for sym in rule)
+
+    def _useful_rules(self, left):
+        return [rule for rule in self.closed.get(left, ()) if self._useful(rule)]
+
+    def _update_productive(self, changed, shrunk):
+        doubtful = set()
+        stack = [left for left in shrunk
+                 if left in self.productive and self.witness[left] not in self.closed.get(left, ())]
+        while stack:
+            left = stack.pop()
+            if left not in doubtful:
+                doubtful.add(left)
+                del self.witness[left]
+                stack.extend(user for user, rule in self.closed_occurrences.get(left, ())
+                             if self.witness.get(user) == rule)
+        self.productive -= doubtful
+
+        gained = set()
+        worklist = [(left, rule) for left in doubtful | changed if left not in self.productive
+                    for rule in self.closed.get(left, ()) if self._useful(rule)]
+        while worklist:
+            left, rule = worklist.pop()
+            if left in self.productive:
+                continue
+            self.productive.add(left)
+            self.witness[left] = rule
+            gained.add(left)
+            worklist.extend((user, rule) for user, rule in self.closed_occurrences.get(left, ())
+                            if user not in self.productive and self._useful(rule))
+        return (doubtful - self.productive) | (gained - doubtful)
+
+    def _eliminate_useless_closed(self, changed, shrunk):
+        flipped = self._update_productive(changed, shrunk)
+        touched = set(changed)
+        for sym in flipped:
+            touched.update(user for user, _ in self.closed_occurrences.get(sym, ()))
+
+        lost = set()
+        found = []
+        if self.S in flipped:
+            (found.append if self.S in self.productive else lost.add)(self.S)
+        for left in touched & self.reachable:
+            old_targets = {sym for rule in self.P[left] for sym in rule if sym not in self.Vt}
+            self.P[left] = self._useful_rules(left)
+            new_targets = {sym for rule in self.P[left] for sym in rule if sym in self.productive}
+            lost |= old_targets - new_targets
+            found.extend(new_targets - old_targets)
+
+        doubtful = set()
+        stack = [left for left in lost if left in self.reachable]
+        while stack:
+            left = stack.pop()
+            if left not in doubtful:
+                doubtful.add(left)
+                stack.extend(sym for rule in self.P[left] for sym in rule if sym in self.reachable)
+        self.reachable -= doubtful
+        found.extend(left for left in doubtful
+                     if left == self.S and left in self.productive
+                     or any(user in self.reachable and self._useful(rule)
+                            for user, rule in self.closed_occurrences.get(left, ())))
+
+        while found:
+            left = found.pop()
+            if left in self.reachable:
+                continue
+            self.reachable.add(left)
+            if left not in self.P:
+                self.P[left] = self._useful_rules(left)
+            found.extend(sym for rule in self.P[left] for sym in rule
+                         if sym in self.productive and sym not in self.reachable)
+
+        for left in doubtful - self.reachable:
+            del self.P[left]
+
+    def _update(self, left, added, removed):
+        changed = set()
+        for rule in added:
+            for lhs, brule in self._binarize(left, rule):
+                self._count_rule(lhs, brule, 1, changed)
+        for rule in removed:
+            for lhs, brule in self._binarize(left, rule):
+                self._count_rule(lhs, brule, -1, changed)
+
+        old_nullable = self.nullable
+        vanished = [(lhs, rule) for lhs, rule in changed if rule not in self.bin_rules.get(lhs, ())]
+        if any(lhs in old_nullable and all(sym in old_nullable for sym in rule) for lhs, rule in vanished):
+            self.nullable = self._derivable_symbols(set(), self.bin_rules)
+        else:
+            self.nullable = set(old_nullable)
+            worklist = [(lhs, rule) for lhs, rule in changed if rule in self.bin_rules.get(lhs, ())]
+            while worklist:
+                lhs, rule = worklist.pop()
+                if lhs not in self.nullable and all(sym in self.nullable for sym in rule):
+                    self.nullable.add(lhs)
+                    worklist.extend(self.occurrences.get(lhs, ()))
+
+        flipped = old_nullable ^ self.nullable
+        dirty = set(changed)
+        for sym in flipped:
+            dirty |= self.occurrences.get(sym, set())
+        self._refresh(dirty, flipped)
+
+    def _parse_edit(self, rule):
+        productions = {}
+        left = self._add_rule(rule, productions)
+        if left in self.Vt:
+            raise ValueError(f"'{self.symbols[left]}' is a terminal and cannot have productions")
+        return left, list(dict.fromkeys(productions[left]))
+
+    def add_rule(self, rule):
+        left, rules = self._parse_edit(rule)
+        self.Vn.add(left)
+        known = self.source.setdefault(left, {})
+        added = [r for r in rules if r not in known]
+        for r in added:
+            self.Vt.update(sym for sym in r if sym not in self.Vn)
+            known[r] = None
+        self._update(left, added, [])
+
+    def remove_rule(self, rule):
+        left, rules = self._parse_edit(rule)
+        known = self.source.get(left, {})
+        for r in rules:
+            if r not in known:
+                raise ValueError(f"No production {self.symbols[left]} -> {self.rule_str(r)}")
+        for r in rules:
+            del known[r]
+        if not known:
+            self.source.pop(left, None)
+        self._update(left, [], rules)
+
+    def rebuild(self):
+        self._reset()
+        changed = set()
+        self._count_rule(self.S, (self.original_S,), 1, changed)
+        for left, rules in self.source.items():
+            for rule in rules:
+                for lhs, brule in self._binarize(left, rule):
+                    self._count_rule(lhs, brule, 1, changed)
+        self.nullable = self._derivable_symbols(set(), self.bin_rules)
+        self._refresh(changed, self.nullable)
+
+    def check(self):
+        reference = copy.deepcopy(self)
+        reference.rebuild()
+        return ({left: set(rules) for left, rules in self.P.items()} ==
+                {left: set(rules) for left, rules in reference.P.items()})
+
+
+def same_language(normalizer, max_length=6):
+    Vt = [normalizer.symbols[sym] for sym in sorted(normalizer.Vt)]
+    P = ', '.join(f"{normalizer.symbols[left]} -> {' | '.join(normalizer.rule_str(rule) for rule in rules)}"
+                  for left, rules in normalizer.source.items())
+    reference = ChomskyNormalizer([normalizer.symbols[sym] for sym in normalizer.source], Vt, P,
+                                  normalizer.symbols[normalizer.original_S])
+    reference.normalize('polynomial', verbose=False)
+
+    expected = CYKParser(reference)
+    actual = CYKParser(normalizer)
+    return all(expected.recognize(word) == actual.recognize(word)
+               for length in range(max_length + 1)
+               for word in itertools.product(Vt, repeat=length))
+
+
+def main():
+    Vn = ["S", "A", "B", "C", "E"]
+    Vt = ["a", "b"]
+    P = "S -> b A C | B, A -> a | a S | b C a C b, B -> A C | b S | a A a, C -> ε | A B, E -> B A"
+
+    normalizer = IncrementalNormalizer(Vn, Vt, P, "S")
+    print(normalizer)
+
+    edits = [
+        (normalizer.add_rule, "E -> ε | a E b"),
+        (normalizer.add_rule, "S -> E"),
+        (normalizer.remove_rule, "C -> ε"),
+        (normalizer.remove_rule, "S -> E"),
+    ]
+    for edit, rule in edits:
+        edit(rule)
+        print(f"\n{edit.__name__} {rule}:")
+        print(normalizer)
+        print(f"same language as full normalization: {same_language(normalizer)}")
+        print(f"matches full rebuild: {normalizer.check()}")
+
+
+if __name__ == "__main__":
+    main()
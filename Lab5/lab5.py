@@ -1,168 +1,313 @@
 import itertools
-from collections import OrderedDict
+import json
+import time
+import tracemalloc
+from collections import OrderedDict, deque, namedtuple
+
+
+EPSILON = 'ε'
+
+
+def bits(mask):
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+PhaseMetrics = namedtuple('PhaseMetrics', ['phase', 'seconds', 'rules', 'nonterminals', 'peak_bytes'])
+
+
+class NormalizationMetrics:
+    def __init__(self, method):
+        self.method = method
+        self.phases = []
+
+    @property
+    def total_seconds(self):
+        return sum(phase.seconds for phase in self.phases)
+
+    def to_dict(self):
+        return {
+            'method': self.method,
+            'total_seconds': self.total_seconds,
+            'phases': [phase._asdict() for phase in self.phases],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def __str__(self):
+        lines = [f"{'phase':<32} | {'time (s)':>9} | {'rules':>7} | {'nonterminals':>12} | {'peak (KiB)':>10}"]
+        for phase in self.phases:
+            lines.append(f"{phase.phase:<32} | {phase.seconds:>9.4f} | {phase.rules:>7} | "
+                         f"{phase.nonterminals:>12} | {phase.peak_bytes / 1024:>10.1f}")
+        return '\n'.join(lines)
 
 
 class ChomskyNormalizer:
     def __init__(self, Vn, Vt, P, S):
-        self.Vn = Vn.copy()
-        self.Vt = Vt.copy()
+        self.symbols = []
+        self.symbol_ids = {}
+        self.Vn = {self._intern(nt) for nt in Vn}
+        self.Vt = {self._intern(t) for t in Vt}
         self.P = self._parse_productions(P)
-        self.S = S
+        self._set_start(S)
+
+    def _set_start(self, S):
+        self.S = self._intern(S)
         self.terminal_map = {}
         self.pair_map = OrderedDict()
         self.new_nonterm_counter = 0
-        self.original_S = S
+        self.original_S = self.S
+
+    def _intern(self, name):
+        sym = self.symbol_ids.get(name)
+        if sym is None:
+            sym = len(self.symbols)
+            self.symbol_ids[name] = sym
+            self.symbols.append(name)
+        return sym
 
     def _parse_productions(self, P):
         productions = {}
         for rule in P.split(','):
             rule = rule.strip()
-            if not rule:
-                continue
-            left, right = rule.split('->')
-            left = left.strip()
-            alternatives = [alt.strip() for alt in right.split('|')]
-            productions[left] = alternatives
+            if rule:
+                self._add_rule(rule, productions)
         return productions
 
+    def _add_rule(self, rule, productions):
+        left, right = rule.split('->', 1)
+        left = self._intern(left.strip())
+        alternatives = productions.setdefault(left, [])
+        for alt in right.split('|'):
+            alt = alt.strip()
+            if alt == EPSILON:
+                alternatives.append(())
+            else:
+                alternatives.append(tuple(self._intern(sym) for sym in alt.split()))
+        return left
+
+    @classmethod
+    def from_lines(cls, lines, S=None):
+        normalizer = cls.__new__(cls)
+        normalizer.symbols = []
+        normalizer.symbol_ids = {}
+        productions = {}
+        first_left = None
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            left = normalizer._add_rule(line, productions)
+            if first_left is None:
+                first_left = left
+
+        if first_left is None:
+            raise ValueError("Grammar has no productions")
+
+        normalizer.P = productions
+        normalizer.Vn = set(productions)
+        normalizer.Vt = {sym for rules in productions.values() for rule in rules for sym in rule} - normalizer.Vn
+        normalizer._set_start(S if S is not None else normalizer.symbols[first_left])
+        return normalizer
+
+    @classmethod
+    def from_file(cls, path, S=None, encoding='utf-8'):
+        with open(path, encoding=encoding) as lines:
+            return cls.from_lines(lines, S)
+
     def _get_new_nonterminal(self, prefix='N'):
-        new_nonterm = f"{prefix}{self.new_nonterm_counter}"
+        new_nonterm = self._intern(f"{prefix}{self.new_nonterm_counter}")
         self.new_nonterm_counter += 1
+        self.Vn.add(new_nonterm)
         return new_nonterm
 
-    def eliminate_epsilons(self):
-        nullable = set()
-        changed = True
-        while changed:
-            changed = False
-            for left, rights in self.P.items():
-                if left in nullable:
-                    continue
+    def _is_unit(self, rule):
+        return len(rule) == 1 and rule[0] in self.Vn
 
-                for rule in rights:
-                    if rule == 'ε' or (rule and all(sym in nullable for sym in rule.split())):
-                        nullable.add(left)
-                        changed = True
-                        break
-
-        has_empty_string = self.S in nullable
+    def _derivable_symbols(self, base, P=None):
+        if P is None:
+            P = self.P
+        remaining = []
+        occurrences = {}
+        rule_lefts = []
+        found = set()
+        worklist = []
 
+        for left, rights in P.items():
+            for rule in rights:
+                rule_id = len(rule_lefts)
+                rule_lefts.append(left)
+                pending = 0
+                for sym in rule:
+                    if sym not in base:
+                        pending += 1
+                        occurrences.setdefault(sym, []).append(rule_id)
+                remaining.append(pending)
+                if pending == 0 and left not in found:
+                    found.add(left)
+                    worklist.append(left)
+
+        while worklist:
+            sym = worklist.pop()
+            for rule_id in occurrences.get(sym, ()):
+                remaining[rule_id] -= 1
+                left = rule_lefts[rule_id]
+                if remaining[rule_id] == 0 and left not in found:
+                    found.add(left)
+                    worklist.append(left)
+
+        return found
+
+    def _drop_nullable_positions(self, nullable):
         new_P = {}
         for left, rights in self.P.items():
-            new_rules = set()
+            new_rules = {}
             for rule in rights:
-                if rule == 'ε':
+                if not rule:
                     continue
 
-                symbols = rule.split()
-                nullable_indices = [i for i, sym in enumerate(symbols) if sym in nullable]
+                nullable_indices = [i for i, sym in enumerate(rule) if sym in nullable]
 
                 for r in range(len(nullable_indices) + 1):
                     for indices_to_remove in itertools.combinations(nullable_indices, r):
-                        new_rule = [sym for i, sym in enumerate(symbols) if i not in indices_to_remove]
+                        new_rule = tuple(sym for i, sym in enumerate(rule) if i not in indices_to_remove)
                         if new_rule:
-                            new_rules.add(' '.join(new_rule))
+                            new_rules[new_rule] = None
 
             if new_rules:
                 new_P[left] = list(new_rules)
 
+        return new_P
+
+    def eliminate_epsilons(self):
+        nullable = self._derivable_symbols(set())
+
+        has_empty_string = self.S in nullable
+
+        new_P = self._drop_nullable_positions(nullable)
+
         if has_empty_string:
             new_S = self._get_new_nonterminal('S')
-            self.Vn.append(new_S)
-            new_P[new_S] = [self.S]
-            if 'ε' not in new_P.get(self.S, []):
-                new_P.setdefault(self.S, []).append('ε')
+            new_P[new_S] = [(self.S,)]
+            if () not in new_P.get(self.S, []):
+                new_P.setdefault(self.S, []).append(())
             self.original_S = self.S
             self.S = new_S
 
         self.P = new_P
 
-    def eliminate_unit_rules(self):
-        unit_pairs = {}
-
-        for left, rights in self.P.items():
-            unit_pairs[left] = {left}
-            for rule in rights:
-                if rule in self.Vn:
-                    unit_pairs[left].add(rule)
-
-        changed = True
-        while changed:
-            changed = False
-            for A in self.Vn:
-                current_set = unit_pairs.get(A, set())
-                new_set = current_set.copy()
+    def _unit_components(self, graph=None, known=None):
+        if known is None:
+            known = {}
+        if graph is None:
+            graph = {A: [rule[0] for rule in self.P.get(A, []) if self._is_unit(rule)] for A in self.Vn}
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        component_of = {}
+        reaches = []
+
+        for root in sorted(graph):
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, i = work.pop()
+                if i == 0:
+                    index[node] = low[node] = len(index)
+                    stack.append(node)
+                    on_stack.add(node)
+
+                successors = graph.get(node, ())
+                if i < len(successors):
+                    work.append((node, i + 1))
+                    successor = successors[i]
+                    if successor not in index:
+                        work.append((successor, 0))
+                    elif successor in on_stack:
+                        low[node] = min(low[node], index[successor])
+                    continue
 
-                for B in current_set:
-                    new_set.update(unit_pairs.get(B, set()))
+                if low[node] == index[node]:
+                    component = len(reaches)
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component_of[member] = component
+                        members.append(member)
+                        if member == node:
+                            break
+
+                    reach = 0
+                    for member in members:
+                        reach |= known.get(member, 1 << member) if member not in graph else 1 << member
+                        for successor in graph.get(member, ()):
+                            if component_of[successor] != component:
+                                reach |= reaches[component_of[successor]]
+                    reaches.append(reach)
+
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+
+        return component_of, reaches
 
-                if len(new_set) > len(current_set):
-                    unit_pairs[A] = new_set
-                    changed = True
+    def eliminate_unit_rules(self):
+        component_of, reaches = self._unit_components()
 
+        component_rules = {}
         new_P = {}
-        for A in self.Vn:
-            new_rules = []
-            for B in unit_pairs.get(A, set()):
-                for rule in self.P.get(B, []):
-                    if rule not in self.Vn and rule != 'ε':
-                        new_rules.append(rule)
-
-            if new_rules:
-                new_P[A] = new_rules
+        for A in sorted(self.Vn):
+            component = component_of[A]
+            rules = component_rules.get(component)
+            if rules is None:
+                rules = {}
+                for B in bits(reaches[component]):
+                    for rule in self.P.get(B, []):
+                        if rule and not self._is_unit(rule):
+                            rules[rule] = None
+                component_rules[component] = rules
+
+            if rules:
+                new_P[A] = list(rules)
 
         self.P = new_P
 
     def eliminate_inaccessible_symbols(self):
         accessible = set()
-        queue = [self.S]
+        queue = deque([self.S])
 
         while queue:
-            current = queue.pop(0)
+            current = queue.popleft()
             if current not in accessible:
                 accessible.add(current)
                 for rule in self.P.get(current, []):
-                    for sym in rule.split():
+                    for sym in rule:
                         if sym in self.Vn and sym not in accessible:
                             queue.append(sym)
 
-        self.Vn = [nt for nt in self.Vn if nt in accessible]
+        self.Vn &= accessible
 
         self.P = {k: v for k, v in self.P.items() if k in accessible}
 
     def eliminate_nonproductive_symbols(self):
-        productive = set()
-
-        for left, rights in self.P.items():
-            for rule in rights:
-                if rule == 'ε' or all(sym in self.Vt for sym in rule.split()):
-                    productive.add(left)
-                    break
-
-        changed = True
-        while changed:
-            changed = False
-            for left, rights in self.P.items():
-                if left in productive:
-                    continue
-
-                for rule in rights:
-                    if all(sym in self.Vt or sym in productive for sym in rule.split()):
-                        productive.add(left)
-                        changed = True
-                        break
+        productive = self._derivable_symbols(self.Vt)
 
         if self.S not in productive:
             raise ValueError("Grammar does not generate any strings (start symbol is not productive)")
 
-        self.Vn = [nt for nt in self.Vn if nt in productive]
+        self.Vn &= productive
 
         new_P = {}
-        for left in self.Vn:
+        for left in sorted(self.Vn):
             new_rules = []
             for rule in self.P.get(left, []):
-                symbols = rule.split()
-                if rule == 'ε' or all(sym in self.Vt or sym in productive for sym in symbols):
+                if all(sym in self.Vt or sym in productive for sym in rule):
                     new_rules.append(rule)
             if new_rules:
                 new_P[left] = new_rules
@@ -170,67 +315,55 @@ class ChomskyNormalizer:
         self.P = new_P
 
     def _ensure_terminal_rules(self):
-        for term in self.Vt:
+        for term in sorted(self.Vt):
             new_nonterm = self._get_new_nonterminal('T')
             self.terminal_map[term] = new_nonterm
-            self.Vn.append(new_nonterm)
-            self.P[new_nonterm] = [term]
+            self.P[new_nonterm] = [(term,)]
 
         for left in list(self.P.keys()):
             new_rules = []
             for rule in self.P[left]:
-                symbols = rule.split()
-                if len(symbols) == 1 and symbols[0] in self.Vt:
+                if len(rule) == 1 and rule[0] in self.Vt:
                     new_rules.append(rule)
                 else:
-                    new_rule = []
-                    for sym in symbols:
-                        if sym in self.Vt:
-                            new_rule.append(self.terminal_map[sym])
-                        else:
-                            new_rule.append(sym)
-                    new_rules.append(' '.join(new_rule))
+                    new_rules.append(tuple(self.terminal_map.get(sym, sym) for sym in rule))
             self.P[left] = new_rules
 
     def _split_long_rules(self):
         for left in list(self.P.keys()):
             new_rules = []
             for rule in self.P[left]:
-                symbols = rule.split()
-                if len(symbols) <= 2:
+                if len(rule) <= 2:
                     new_rules.append(rule)
-                elif len(symbols) > 2:
-                    current_symbols = symbols
+                else:
+                    current_symbols = rule
                     while len(current_symbols) > 2:
-                        first_two = ' '.join(current_symbols[:2])
+                        first_two = current_symbols[:2]
                         if first_two not in self.pair_map:
                             new_nonterm = self._get_new_nonterminal('N')
                             self.pair_map[first_two] = new_nonterm
-                            self.Vn.append(new_nonterm)
                             self.P[new_nonterm] = [first_two]
 
-                        current_symbols = [self.pair_map[first_two]] + current_symbols[2:]
+                        current_symbols = (self.pair_map[first_two],) + current_symbols[2:]
 
-                    new_rules.append(' '.join(current_symbols))
+                    new_rules.append(current_symbols)
 
             self.P[left] = new_rules
 
     def convert_to_cnf(self):
-        if any(self.S in rule.split() for rules in self.P.values() for rule in rules):
+        if any(self.S in rule for rules in self.P.values() for rule in rules):
             new_S = self._get_new_nonterminal('S')
-            self.Vn.append(new_S)
 
             self.P[new_S] = self.P[self.S].copy()
             self.S = new_S
 
         for rule in self.P.get(self.S, []):
-            if rule == 'ε':
-                self.P[self.S].remove('ε')
+            if not rule:
+                self.P[self.S].remove(())
                 if not self.P[self.S]:
                     placeholder = self._get_new_nonterminal('X')
-                    self.Vn.append(placeholder)
-                    self.P[placeholder] = ['ε']
-                    self.P[self.S] = [placeholder]
+                    self.P[placeholder] = [()]
+                    self.P[self.S] = [(placeholder,)]
                 break
 
         self._ensure_terminal_rules()
@@ -238,39 +371,96 @@ class ChomskyNormalizer:
 
         self.eliminate_unit_rules()
 
-    def normalize(self):
-        print("initial grammar:")
-        print(self)
+    def _add_start_rule(self):
+        new_S = self._get_new_nonterminal('S')
+        self.P[new_S] = [(self.S,)]
+        self.original_S = self.S
+        self.S = new_S
 
-        self.eliminate_epsilons()
-        print("\nε-elimination:")
-        print(self)
+    def _eliminate_nullable_positions(self):
+        nullable = self._derivable_symbols(set())
+        self.P = self._drop_nullable_positions(nullable)
+        if self.S in nullable:
+            self.P.setdefault(self.S, []).append(())
 
+    def _eliminate_unit_rules_keeping_start(self):
+        start_has_epsilon = () in self.P.get(self.S, [])
         self.eliminate_unit_rules()
-        print("\nunit rule elimination:")
-        print(self)
-
-        self.eliminate_inaccessible_symbols()
-        print("\nremoving inaccessible symbols:")
-        print(self)
+        if start_has_epsilon:
+            self.P.setdefault(self.S, []).append(())
 
+    def _eliminate_useless_symbols(self):
         self.eliminate_nonproductive_symbols()
-        print("\nremoving non-productive symbols:")
-        print(self)
+        self.eliminate_inaccessible_symbols()
 
-        self.convert_to_cnf()
-        print("\nFinal CNF:")
-        print(self)
+    def phases(self, method='classic'):
+        if method == 'classic':
+            return [
+                ("ε-elimination", self.eliminate_epsilons),
+                ("unit rule elimination", self.eliminate_unit_rules),
+                ("removing inaccessible symbols", self.eliminate_inaccessible_symbols),
+                ("removing non-productive symbols", self.eliminate_nonproductive_symbols),
+                ("Final CNF", self.convert_to_cnf),
+            ]
+        elif method == 'polynomial':
+            return [
+                ("START: new start symbol", self._add_start_rule),
+                ("TERM: terminal rules", self._ensure_terminal_rules),
+                ("BIN: binarized rules", self._split_long_rules),
+                ("DEL: ε-elimination", self._eliminate_nullable_positions),
+                ("UNIT: unit rule elimination", self._eliminate_unit_rules_keeping_start),
+                ("Final CNF", self._eliminate_useless_symbols),
+            ]
+        raise ValueError(f"Unknown normalization method '{method}'")
+
+    def normalize(self, method='classic', verbose=True, metrics=False):
+        phases = self.phases(method)
+        self.metrics = NormalizationMetrics(method) if metrics else None
+        tracing = metrics and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
+        if verbose:
+            print("initial grammar:")
+            print(self)
+
+        try:
+            for title, phase in phases:
+                if metrics:
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    start = time.perf_counter()
+                phase()
+                if metrics:
+                    seconds = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1] - baseline
+                    self.metrics.phases.append(PhaseMetrics(
+                        title, seconds, sum(len(rules) for rules in self.P.values()), len(self.P), peak))
+                if verbose:
+                    print(f"\n{title}:")
+                    print(self)
+        finally:
+            if tracing:
+                tracemalloc.stop()
 
         return self
 
+    def rule_str(self, rule):
+        if not rule:
+            return EPSILON
+        return ' '.join(self.symbols[sym] for sym in rule)
+
+    def productions(self):
+        return {self.symbols[left]: [self.rule_str(rule) for rule in rules]
+                for left, rules in self.P.items()}
+
     def __str__(self):
         lines = []
-        for left in sorted(self.P.keys()):
+        for left in sorted(self.P.keys(), key=lambda sym: self.symbols[sym]):
             if not self.P[left]:
                 continue
-            rhs = ' | '.join(self.P[left])
-            lines.append(f"{left} -> {rhs}")
+            rhs = ' | '.join(self.rule_str(rule) for rule in self.P[left])
+            lines.append(f"{self.symbols[left]} -> {rhs}")
         return '\n'.join(lines)
 
 
@@ -0,0 +1,111 @@
+import random
+
+from lab5 import ChomskyNormalizer
+
+
+class SentenceGenerator:
+    """Samples sentences of a fixed length uniformly over derivations of a CNF grammar.
+
+    count() is the exact number of parse trees, not of distinct sentences. The two agree only for an
+    unambiguous grammar; both normalization methods usually produce ambiguous CNF, and then each
+    sentence is drawn in proportion to its number of parse trees.
+    """
+
+    def __init__(self, normalizer, seed=None):
+        self.normalizer = normalizer
+        self.rng = random.Random(seed)
+        self.terminal_rules = {}
+        self.pair_rules = {}
+        for left, rules in normalizer.P.items():
+            for rule in rules:
+                if len(rule) == 1 and rule[0] in normalizer.Vt:
+                    self.terminal_rules.setdefault(left, []).append(normalizer.symbols[rule[0]])
+                elif len(rule) == 2 and rule[0] in normalizer.Vn and rule[1] in normalizer.Vn:
+                    self.pair_rules.setdefault(left, []).append(rule)
+                elif rule or left != normalizer.S:
+                    raise ValueError("Grammar is not in Chomsky normal form; call normalize() first")
+
+        terminals = [name for names in self.terminal_rules.values() for name in names]
+        self.separator = '' if all(len(name) == 1 for name in terminals) else ' '
+        self.counts = {left: [0] for left in normalizer.P}
+        if () in normalizer.P.get(normalizer.S, []):
+            self.counts[normalizer.S][0] = 1
+        self.max_length = 0
+
+    def _extend(self, length):
+        counts = self.counts
+        empty = [0] * (length + 1)
+        for n in range(self.max_length + 1, length + 1):
+            for left in counts:
+                total = len(self.terminal_rules.get(left, ())) if n == 1 else 0
+                for B, C in self.pair_rules.get(left, ()):
+                    left_counts = counts.get(B, empty)
+                    right_counts = counts.get(C, empty)
+                    for k in range(1, n):
+                        if left_counts[k] and right_counts[n - k]:
+                            total += left_counts[k] * right_counts[n - k]
+                counts[left].append(total)
+            self.max_length = n
+
+    def count(self, length):
+        if length < 0 or self.normalizer.S not in self.counts:
+            return 0
+        if length > self.max_length:
+            self._extend(length)
+        return self.counts[self.normalizer.S][length]
+
+    def sample(self, length, rng=None):
+        if rng is None:
+            rng = self.rng
+        if self.count(length) == 0:
+            raise ValueError(f"Grammar has no sentences of length {length}")
+
+        counts = self.counts
+        words = []
+        stack = [(self.normalizer.S, length)] if length else []
+        while stack:
+            left, n = stack.pop()
+            pick = rng.randrange(counts[left][n])
+            if n == 1:
+                words.append(self.terminal_rules[left][pick])
+                continue
+
+            for B, C in self.pair_rules[left]:
+                for k in range(1, n):
+                    weight = counts[B][k] * counts[C][n - k] if B in counts and C in counts else 0
+                    if pick < weight:
+                        stack.append((C, n - k))
+                        stack.append((B, k))
+                        break
+                    pick -= weight
+                else:
+                    continue
+                break
+
+        return self.separator.join(words)
+
+    def generate(self, length, count=10, seed=None):
+        rng = self.rng if seed is None else random.Random(seed)
+        return [self.sample(length, rng) for _ in range(count)]
+
+
+def main():
+    Vn = ["S", "A", "B", "C", "E"]
+    Vt = ["a", "b"]
+    P = "S -> b A C | B, A -> a | a S | b C a C b, B -> A C | b S | a A a, C -> ε | A B, E -> B A"
+
+    normalizer = ChomskyNormalizer(Vn, Vt, P, "S")
+    normalizer.normalize('polynomial', verbose=False)
+    generator = SentenceGenerator(normalizer, seed=23)
+
+    for length in range(1, 9):
+        print(f"derivations of length {length}: {generator.count(length)} (at most {len(Vt) ** length} sentences)")
+    print(f"derivations of length 200: {generator.count(200):.3e} (at most {len(Vt) ** 200:.3e} sentences)")
+
+    print("\nSamples of length 8, uniform over derivations (ambiguous sentences are over-sampled):")
+    for sentence in generator.generate(8, count=5):
+        print(sentence)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+import sys
+import time
+from collections import namedtuple
+
+from lab6 import FILES, PIECES, Capture, Castle, ChessParser, GameView, PawnMove, PieceMove, lex, test_cases
+
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+FILE_MASKS = [0x0101010101010101 << f for f in range(8)]
+RANK_MASKS = [0xFF << (8 * r) for r in range(8)]
+
+
+def _bits(mask):
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def _steps(offsets):
+    table = []
+    for sq in range(64):
+        f, r = sq % 8, sq // 8
+        mask = 0
+        for df, dr in offsets:
+            if 0 <= f + df < 8 and 0 <= r + dr < 8:
+                mask |= 1 << (sq + df + 8 * dr)
+        table.append(mask)
+    return table
+
+
+def _ray(df, dr):
+    table = []
+    for sq in range(64):
+        f, r = sq % 8 + df, sq // 8 + dr
+        mask = 0
+        while 0 <= f < 8 and 0 <= r < 8:
+            mask |= 1 << (f + 8 * r)
+            f, r = f + df, r + dr
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _steps([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = _steps([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+PAWN_ATTACKS = [_steps([(-1, 1), (1, 1)]), _steps([(-1, -1), (1, -1)])]
+
+NORTH, EAST, NORTH_EAST, NORTH_WEST = _ray(0, 1), _ray(1, 0), _ray(1, 1), _ray(-1, 1)
+SOUTH, WEST, SOUTH_EAST, SOUTH_WEST = _ray(0, -1), _ray(-1, 0), _ray(1, -1), _ray(-1, -1)
+ROOK_RAYS = ((NORTH, EAST), (SOUTH, WEST))
+BISHOP_RAYS = ((NORTH_EAST, NORTH_WEST), (SOUTH_EAST, SOUTH_WEST))
+ROOK_LINES = [NORTH[sq] | EAST[sq] | SOUTH[sq] | WEST[sq] for sq in range(64)]
+BISHOP_LINES = [NORTH_EAST[sq] | NORTH_WEST[sq] | SOUTH_EAST[sq] | SOUTH_WEST[sq] for sq in range(64)]
+
+
+def _pin_rays():
+    rays = [0] * 4096
+    diagonal = [False] * 4096
+    for tables, is_diagonal in (((NORTH, EAST, SOUTH, WEST), False),
+                                ((NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST), True)):
+        for table in tables:
+            for king in range(64):
+                for origin in _bits(table[king]):
+                    rays[king * 64 + origin] = table[origin]
+                    diagonal[king * 64 + origin] = is_diagonal
+    return rays, diagonal
+
+
+PIN_RAYS, PIN_DIAGONAL = _pin_rays()
+
+
+def _slider_attacks(sq, occupied, rays):
+    increasing, decreasing = rays
+    attacks = 0
+    for table in increasing:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= table[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for table in decreasing:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= table[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, BISHOP_RAYS)
+
+
+SQUARE_NAMES = [f"{FILES[sq % 8]}{sq // 8 + 1}" for sq in range(64)]
+SQUARE_INDEX = {name: sq for sq, name in enumerate(SQUARE_NAMES)}
+
+
+def square_name(sq):
+    return SQUARE_NAMES[sq]
+
+
+def square_index(name):
+    return SQUARE_INDEX[name]
+
+
+PIECE_INDEX = {piece: kind for kind, piece in enumerate(PIECES)}
+
+CASTLING = {
+    (WHITE, True): (4, 6, 7, 5, 0b0001),
+    (WHITE, False): (4, 2, 0, 3, 0b0010),
+    (BLACK, True): (60, 62, 63, 61, 0b0100),
+    (BLACK, False): (60, 58, 56, 59, 0b1000),
+}
+CASTLING_RIGHTS_LOST = {4: 0b0011, 0: 0b0010, 7: 0b0001, 60: 0b1100, 56: 0b1000, 63: 0b0100}
+
+
+class Board:
+    _start = None
+
+    def __init__(self):
+        start = Board._start
+        if start is None:
+            start = Board._start = self._start_position()
+        self.pieces = start[0][:]
+        self.colors = start[1][:]
+        self.squares = start[2][:]
+        self.side = WHITE
+        self.castling = 0b1111
+        self.en_passant = -1
+        self.in_check = False
+
+    @staticmethod
+    def _start_position():
+        pieces = [0] * 12
+        colors = [0, 0]
+        squares = [-1] * 64
+        back_rank = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+        for f, kind in enumerate(back_rank):
+            for code, sq in ((WHITE * 6 + kind, f), (WHITE * 6 + PAWN, 8 + f),
+                             (BLACK * 6 + PAWN, 48 + f), (BLACK * 6 + kind, 56 + f)):
+                pieces[code] |= 1 << sq
+                colors[code // 6] |= 1 << sq
+                squares[sq] = code
+        return pieces, colors, squares
+
+    def occupancy(self, color):
+        return self.colors[color]
+
+    def king_square(self, color):
+        return self.pieces[color * 6 + KING].bit_length() - 1
+
+    def is_attacked(self, sq, color, occupied=None, mask=-1):
+        p = self.pieces
+        base = color * 6
+        if occupied is None:
+            occupied = self.colors[WHITE] | self.colors[BLACK]
+        if KNIGHT_ATTACKS[sq] & p[base + KNIGHT] & mask:
+            return True
+        if PAWN_ATTACKS[1 - color][sq] & p[base + PAWN] & mask:
+            return True
+        if KING_ATTACKS[sq] & p[base + KING]:
+            return True
+        queens = p[base + QUEEN]
+        rooks = (p[base + ROOK] | queens) & mask
+        if rooks & ROOK_LINES[sq] and rook_attacks(sq, occupied) & rooks:
+            return True
+        bishops = (p[base + BISHOP] | queens) & mask
+        if bishops & BISHOP_LINES[sq] and bishop_attacks(sq, occupied) & bishops:
+            return True
+        return False
+
+    def _is_legal(self, origin, target, code, captured_sq):
+        side = code // 6
+        if code % 6 == KING:
+            king_sq = target
+        else:
+            king_sq = self.king_square(side)
+            if not self.in_check and (captured_sq < 0 or captured_sq == target):
+                beyond = PIN_RAYS[king_sq * 64 + origin]
+                if not beyond:
+                    return True
+                p = self.pieces
+                base = 6 - side * 6
+                sliders = p[base + QUEEN] | p[base + (BISHOP if PIN_DIAGONAL[king_sq * 64 + origin] else ROOK)]
+                if not beyond & sliders:
+                    return True
+
+        occupied = (self.colors[WHITE] | self.colors[BLACK]) & ~(1 << origin) | 1 << target
+        mask = -1
+        if captured_sq >= 0:
+            occupied &= ~(1 << captured_sq) | (1 << target)
+            mask = ~(1 << captured_sq)
+        return not self.is_attacked(king_sq, 1 - side, occupied, mask)
+
+    def _apply(self, origin, target, code, captured_sq, promotion=None):
+        p = self.pieces
+        colors = self.colors
+        squares = self.squares
+        if captured_sq >= 0:
+            captured = squares[captured_sq]
+            p[captured] &= ~(1 << captured_sq)
+            colors[captured // 6] &= ~(1 << captured_sq)
+            squares[captured_sq] = -1
+        p[code] &= ~(1 << origin)
+        squares[origin] = -1
+        placed = code if promotion is None else code - code % 6 + promotion
+        p[placed] |= 1 << target
+        squares[target] = placed
+        colors[code // 6] ^= 1 << origin | 1 << target
+
+        self.castling &= ~(CASTLING_RIGHTS_LOST.get(origin, 0) | CASTLING_RIGHTS_LOST.get(target, 0))
+        self.en_passant = -1
+        if code % 6 == PAWN and abs(target - origin) == 16:
+            self.en_passant = (origin + target) // 2
+
+    def _finish_move(self):
+        self.side = 1 - self.side
+        self.in_check = self.is_attacked(self.king_square(self.side), 1 - self.side)
+
+    def _candidates(self, kind, target):
+        occupied = self.colors[WHITE] | self.colors[BLACK]
+        if kind == KNIGHT:
+            candidates = KNIGHT_ATTACKS[target]
+        elif kind == KING:
+            candidates = KING_ATTACKS[target]
+        elif kind == BISHOP:
+            candidates = bishop_attacks(target, occupied)
+        elif kind == ROOK:
+            candidates = rook_attacks(target, occupied)
+        else:
+            candidates = rook_attacks(target, occupied) | bishop_attacks(target, occupied)
+        return candidates & self.pieces[self.side * 6 + kind]
+
+    def legal_origins(self, kind, target, captured_sq):
+        code = self.side * 6 + kind
+        return [sq for sq in _bits(self._candidates(kind, target)) if self._is_legal(sq, target, code, captured_sq)]
+
+    def _piece_origin(self, kind, target, origin_file, origin_rank, captured_sq):
+        code = self.side * 6 + kind
+        candidates = self._candidates(kind, target)
+        if origin_file is not None:
+            candidates &= FILE_MASKS[FILES.index(origin_file)]
+        if origin_rank is not None:
+            candidates &= RANK_MASKS[int(origin_rank) - 1]
+
+        if candidates and not candidates & (candidates - 1):
+            origin = candidates.bit_length() - 1
+            if self._is_legal(origin, target, code, captured_sq):
+                return origin
+            legal = []
+        else:
+            legal = [sq for sq in _bits(candidates) if self._is_legal(sq, target, code, captured_sq)]
+        if not legal:
+            raise ValueError(f"No {PIECES[kind]} can reach {square_name(target)}")
+        if len(legal) > 1:
+            raise ValueError(f"Ambiguous move: {len(legal)} {PIECES[kind]}s can reach {square_name(target)}")
+        return legal[0]
+
+    def _castle(self, kingside):
+        side = self.side
+        king_from, king_to, rook_from, rook_to, right = CASTLING[(side, kingside)]
+        if not self.castling & right:
+            raise ValueError("Castling rights have been lost")
+        occupied = self.colors[WHITE] | self.colors[BLACK]
+        low, high = sorted((king_from, rook_from))
+        if any(occupied >> sq & 1 for sq in range(low + 1, high)):
+            raise ValueError("Pieces stand between king and rook")
+        step = 1 if king_to > king_from else -1
+        if any(self.is_attacked(sq, 1 - side, occupied) for sq in range(king_from, king_to + step, step)):
+            raise ValueError("King castles out of, through or into check")
+
+        self._apply(rook_from, rook_to, side * 6 + ROOK, -1)
+        self._apply(king_from, king_to, side * 6 + KING, -1)
+
+    def _pawn_move(self, action, capture):
+        side = self.side
+        code = side * 6 + PAWN
+        forward = 8 if side == WHITE else -8
+        target = SQUARE_INDEX[action.destination]
+        target_code = self.squares[target]
+        captured_sq = -1
+        if not 0 <= target - forward < 64:
+            raise ValueError(f"No pawn can reach {action.destination}")
+
+        if capture:
+            origin = target - forward + FILES.index(action.origin_file) - target % 8
+            if abs(FILES.index(action.origin_file) - target % 8) != 1 or self.squares[origin] != code:
+                raise ValueError(f"No pawn on the {action.origin_file}-file can capture on {action.destination}")
+            if target == self.en_passant:
+                captured_sq = target - forward
+            elif target_code >= 0 and target_code // 6 != side:
+                captured_sq = target
+            else:
+                raise ValueError(f"Nothing to capture on {action.destination}")
+        else:
+            if target_code >= 0:
+                raise ValueError(f"Pawn push to occupied square {action.destination}")
+            origin = target - forward
+            start_rank = 3 if side == WHITE else 4
+            if self.squares[origin] < 0 and target // 8 == start_rank:
+                origin -= forward
+            if self.squares[origin] != code:
+                raise ValueError(f"No pawn can advance to {action.destination}")
+
+        last_rank = 7 if side == WHITE else 0
+        promotion = action.promotion_piece
+        if (target // 8 == last_rank) != bool(promotion):
+            raise ValueError("Pawn must promote on the last rank" if promotion is None
+                             else "Promotion before the last rank")
+        if not self._is_legal(origin, target, code, captured_sq):
+            raise ValueError("Move leaves the king in check")
+
+        self._apply(origin, target, code, captured_sq, PIECE_INDEX[promotion] if promotion else None)
+        return origin
+
+    def _piece_move(self, action):
+        kind = PIECE_INDEX[action.piece]
+        target = SQUARE_INDEX[action.destination]
+        target_code = self.squares[target]
+        if target_code >= 0 and target_code // 6 == self.side:
+            raise ValueError(f"{action.destination} is occupied by an own piece")
+        if (type(action) is Capture) != (target_code >= 0):
+            raise ValueError(f"Nothing to capture on {action.destination}" if target_code < 0
+                             else f"Capture on {action.destination} is not marked with 'x'")
+        captured_sq = target if target_code >= 0 else -1
+        origin = self._piece_origin(kind, target, action.origin_file, action.origin_rank, captured_sq)
+        self._apply(origin, target, self.side * 6 + kind, captured_sq)
+        return origin
+
+    def play(self, action):
+        action_type = type(action)
+        if action_type is PieceMove:
+            origin = self._piece_move(action)
+        elif action_type is PawnMove:
+            origin = self._pawn_move(action, False)
+        elif action_type is Capture:
+            origin = self._pawn_move(action, True) if action.piece == 'P' else self._piece_move(action)
+        elif action_type is Castle:
+            self._castle(action.is_kingside)
+            origin = None
+        else:
+            raise ValueError(f"Unsupported move {action!r}")
+
+        self._finish_move()
+        return origin
+
+    def has_legal_move(self):
+        side = self.side
+        base = side * 6
+        own = self.colors[side]
+        enemy = self.colors[1 - side]
+        occupied = own | enemy
+        p = self.pieces
+
+        for kind in (KING, KNIGHT, BISHOP, ROOK, QUEEN):
+            code = base + kind
+            for origin in _bits(p[code]):
+                if kind == KING:
+                    targets = KING_ATTACKS[origin]
+                elif kind == KNIGHT:
+                    targets = KNIGHT_ATTACKS[origin]
+                elif kind == BISHOP:
+                    targets = bishop_attacks(origin, occupied)
+                elif kind == ROOK:
+                    targets = rook_attacks(origin, occupied)
+                else:
+                    targets = rook_attacks(origin, occupied) | bishop_attacks(origin, occupied)
+                for target in _bits(targets & ~own):
+                    if self._is_legal(origin, target, code, target if enemy >> target & 1 else -1):
+                        return True
+
+        forward = 8 if side == WHITE else -8
+        start_rank = 1 if side == WHITE else 6
+        for origin in _bits(p[base + PAWN]):
+            target = origin + forward
+            if not occupied >> target & 1:
+                if self._is_legal(origin, target, base + PAWN, -1):
+                    return True
+                double = target + forward
+                if origin // 8 == start_rank and not occupied >> double & 1:
+                    if self._is_legal(origin, double, base + PAWN, -1):
+                        return True
+            for target in _bits(PAWN_ATTACKS[side][origin]):
+                if enemy >> target & 1:
+                    if self._is_legal(origin, target, base + PAWN, target):
+                        return True
+                elif target == self.en_passant:
+                    if self._is_legal(origin, target, base + PAWN, target - forward):
+                        return True
+        return False
+
+
+GameIssue = namedtuple('GameIssue', ['ply', 'move', 'message'])
+
+
+def replay_game(game, fill_origins=True):
+    board = Board()
+    issues = []
+    finished = False
+    ply = 0
+    store = game.store if isinstance(game, GameView) else None
+    for index, move in enumerate(game.moves):
+        for side, action in enumerate((move.white_move, move.black_move)):
+            if action is None:
+                continue
+            changed = False
+            if finished:
+                issues.append(GameIssue(ply, f"{move.number} {action!r}", "Move after checkmate"))
+                return issues
+            try:
+                origin = board.play(action)
+            except ValueError as e:
+                issues.append(GameIssue(ply, f"{move.number} {action!r}", str(e)))
+                return issues
+
+            if fill_origins and origin is not None and type(action) is not PawnMove:
+                name = SQUARE_NAMES[origin]
+                if action.origin_file != name[0] or action.origin_rank != name[1]:
+                    action.origin_file = name[0]
+                    action.origin_rank = name[1]
+                    changed = True
+
+            is_checkmate = board.in_check and not board.has_legal_move()
+            is_check = board.in_check and not is_checkmate
+            if action.is_checkmate != is_checkmate or action.is_check != is_check:
+                expected = "#" if is_checkmate else "+" if is_check else "no check mark"
+                issues.append(GameIssue(ply, f"{move.number} {action!r}", f"Expected {expected}"))
+                action.is_check = is_check
+                action.is_checkmate = is_checkmate
+                changed = True
+            if changed and store is not None:
+                store.update_action(2 * (game.start + index) + side, action)
+            finished = is_checkmate
+            ply += 1
+    return issues
+
+
+def _minimal_origin(origin, others):
+    name = SQUARE_NAMES[origin]
+    if not others:
+        return None, None
+    if all(sq % 8 != origin % 8 for sq in others):
+        return name[0], None
+    if all(sq // 8 != origin // 8 for sq in others):
+        return None, name[1]
+    return name[0], name[1]
+
+
+def canonical_actions(game):
+    board = Board()
+    for move in game.moves:
+        for action in (move.white_move, move.black_move):
+            if action is None:
+                continue
+            action_type = type(action)
+            if action_type is PieceMove or action_type is Capture and action.piece != 'P':
+                kind = PIECE_INDEX[action.piece]
+                target = SQUARE_INDEX[action.destination]
+                legal = board.legal_origins(kind, target, target if board.squares[target] >= 0 else -1)
+                origin = board.play(action)
+                origin_file, origin_rank = _minimal_origin(origin, [sq for sq in legal if sq != origin])
+                canonical = action_type(action.piece, origin_file, origin_rank, action.destination)
+                canonical.is_check = action.is_check
+                canonical.is_checkmate = action.is_checkmate
+                action = canonical
+            elif action_type is Capture:
+                board.play(action)
+                canonical = Capture('P', action.origin_file, None, action.destination, action.promotion_piece)
+                canonical.is_check = action.is_check
+                canonical.is_checkmate = action.is_checkmate
+                action = canonical
+            else:
+                board.play(action)
+            yield action
+
+
+def main():
+    games = [ChessParser(lex(moves)).parse() for moves in test_cases]
+    for moves, game in zip(test_cases, games):
+        print(f"{moves}\n  issues: {replay_game(game, fill_origins=False) or 'none'}")
+
+    illegal = ChessParser(lex("1. e4 e5 2. Ke3 Nf6 3. Bb5 Qe7 4. Nf3 Qxe4+")).parse()
+    print(f"\nillegal game issues: {replay_game(illegal)}")
+
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    corpus = [ChessParser(lex(moves)).parse() for moves in test_cases] * repeats
+    plies = sum(1 for game in corpus for move in game.moves for action in (move.white_move, move.black_move)
+                if action is not None)
+    start = time.perf_counter()
+    for game in corpus:
+        replay_game(game)
+    elapsed = time.perf_counter() - start
+    print(f"\nreplayed {plies} moves in {elapsed:.2f}s ({plies / elapsed:,.0f} moves/s)")
+
+
+if __name__ == "__main__":
+    main()
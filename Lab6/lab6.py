@@ -1,4 +1,8 @@
+import io
 import re
+from array import array
+from collections import namedtuple
+from collections.abc import Sequence
 from enum import Enum, auto
 
 
@@ -34,7 +38,7 @@ token_specs = [
     (TokenType.MOVE_NUM, r'\d+\.'),
     (TokenType.CASTLE, r'O-O(?:-O)?'),
     (TokenType.PROMOTION, r'[a-h][18]=[NBRQ]'),
-    (TokenType.PAWN_CAPTURE, r'[a-h]x[a-h][1-8]'),
+    (TokenType.PAWN_CAPTURE, r'[a-h]x[a-h][1-8](?:=[NBRQ])?'),
     (TokenType.PIECE_CAPTURE, r'[NBRQK][a-h]?[1-8]?x[a-h][1-8]'),
     (TokenType.PIECE_MOVE, r'[NBRQK][a-h]?[1-8]?[a-h][1-8]'),
     (TokenType.PIECE, r'[NBRQK]'),
@@ -48,45 +52,38 @@ token_specs = [
 
 tok_regex = '|'.join(f'(?P<{name.name}>{pattern})' for name, pattern in token_specs)
 pattern = re.compile(tok_regex)
+token_types = {token_type.name: token_type for token_type, _ in token_specs}
 
 
-def lex(input_str):
-    tokens = []
-    line_num = 1
-    line_start = 0
+def iter_lex(source, recover=False):
+    if isinstance(source, str):
+        source = io.StringIO(source)
 
-    pos = 0
-    while pos < len(input_str):
-        match = pattern.match(input_str, pos)
-        if not match:
-            raise ValueError(f'No match found at position {pos}')
+    for line_num, line in enumerate(source, 1):
+        for match in pattern.finditer(line):
+            token_type = token_types[match.lastgroup]
+            if token_type is TokenType.SEPARATOR:
+                continue
+            if token_type is TokenType.MISMATCH and not recover:
+                raise ValueError(f'Incorrect character {match.group()!r} '
+                                 f'at line {line_num}, column {match.start() + 1}')
+            yield Token(token_type, match.group(), line_num, match.start() + 1)
 
-        token_type_name = match.lastgroup
-        token_value = match.group(token_type_name)
-        token_type = TokenType[token_type_name]
 
-        line_num += input_str[pos:match.start()].count('\n')
-        if '\n' in input_str[pos:match.start()]:
-            line_start = input_str.rfind('\n', pos, match.start()) + 1
-        column = match.start() - line_start + 1
+def lex(input_str, recover=False):
+    return list(iter_lex(input_str, recover))
 
-        if token_type == TokenType.SEPARATOR:
-            pass
-        elif token_type == TokenType.MISMATCH:
-            raise ValueError(f'Incorrect character {token_value!r} at line {line_num}, column {column}')
-        else:
-            tokens.append(Token(token_type, token_value, line_num, column))
-
-        pos = match.end()
 
-    return tokens
+Diagnostic = namedtuple('Diagnostic', ['game', 'line', 'column', 'message'])
 
 
 class ASTNode:
-    pass
+    __slots__ = ()
 
 
 class Game(ASTNode):
+    __slots__ = ('moves',)
+
     def __init__(self):
         self.moves = []
 
@@ -95,6 +92,8 @@ class Game(ASTNode):
 
 
 class Move(ASTNode):
+    __slots__ = ('number', 'white_move', 'black_move')
+
     def __init__(self, number=None):
         self.number = number
         self.white_move = None
@@ -105,10 +104,12 @@ class Move(ASTNode):
 
 
 class MoveAction(ASTNode):
-    pass
+    __slots__ = ('is_check', 'is_checkmate')
 
 
 class PieceMove(MoveAction):
+    __slots__ = ('piece', 'origin_file', 'origin_rank', 'destination')
+
     def __init__(self, piece, origin_file=None, origin_rank=None, destination=None):
         self.piece = piece
         self.origin_file = origin_file
@@ -131,6 +132,8 @@ class PieceMove(MoveAction):
 
 
 class PawnMove(MoveAction):
+    __slots__ = ('destination', 'promotion_piece')
+
     def __init__(self, destination, promotion_piece=None):
         self.destination = destination
         self.promotion_piece = promotion_piece
@@ -146,11 +149,14 @@ class PawnMove(MoveAction):
 
 
 class Capture(MoveAction):
-    def __init__(self, piece, origin_file=None, origin_rank=None, destination=None):
+    __slots__ = ('piece', 'origin_file', 'origin_rank', 'destination', 'promotion_piece')
+
+    def __init__(self, piece, origin_file=None, origin_rank=None, destination=None, promotion_piece=None):
         self.piece = piece
         self.origin_file = origin_file
         self.origin_rank = origin_rank
         self.destination = destination
+        self.promotion_piece = promotion_piece
         self.is_check = False
         self.is_checkmate = False
 
@@ -161,13 +167,16 @@ class Capture(MoveAction):
         if self.origin_rank:
             origin += self.origin_rank
 
+        promotion = f"={self.promotion_piece}" if self.promotion_piece else ""
         check = "+" if self.is_check else ""
         checkmate = "#" if self.is_checkmate else ""
 
-        return f"Capture({self.piece}{origin}x{self.destination}{check}{checkmate})"
+        return f"Capture({self.piece}{origin}x{self.destination}{promotion}{check}{checkmate})"
 
 
 class Castle(MoveAction):
+    __slots__ = ('is_kingside',)
+
     def __init__(self, is_kingside):
         self.is_kingside = is_kingside
         self.is_check = False
@@ -181,20 +190,226 @@ class Castle(MoveAction):
         return f"Castle({castle_type}{check}{checkmate})"
 
 
+class MoveKind:
+    NONE = 0
+    PAWN = 1
+    PIECE = 2
+    CAPTURE = 3
+    CASTLE = 4
+
+
+PIECES = 'PNBRQK'
+FILES = 'abcdefgh'
+FLAG_CHECK = 1
+FLAG_CHECKMATE = 2
+FLAG_KINGSIDE = 4
+PROMOTION_SHIFT = 3
+
+
+def _square_index(square):
+    return FILES.index(square[0]) * 8 + int(square[1]) - 1
+
+
+def _square_name(index):
+    return f"{FILES[index // 8]}{index % 8 + 1}"
+
+
+class GameStore:
+    def __init__(self):
+        self.numbers = array('I')
+        self.kinds = array('B')
+        self.pieces = array('B')
+        self.from_files = array('b')
+        self.from_ranks = array('b')
+        self.to_squares = array('b')
+        self.flags = array('B')
+        self.game_offsets = array('Q', [0])
+
+    def __len__(self):
+        return len(self.game_offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("game index out of range")
+        return GameView(self, self.game_offsets[index], self.game_offsets[index + 1])
+
+    def _columns(self):
+        return [self.numbers, self.kinds, self.pieces, self.from_files, self.from_ranks, self.to_squares,
+                self.flags, self.game_offsets]
+
+    def to_bytes(self):
+        header = array('Q', [len(column) for column in self._columns()])
+        return header.tobytes() + b''.join(column.tobytes() for column in self._columns())
+
+    @classmethod
+    def from_bytes(cls, data):
+        store = cls()
+        columns = store._columns()
+        header = array('Q')
+        header.frombytes(data[:header.itemsize * len(columns)])
+        pos = header.itemsize * len(columns)
+        for column, length in zip(columns, header):
+            del column[:]
+            size = column.itemsize * length
+            column.frombytes(data[pos:pos + size])
+            pos += size
+        return store
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def add_game(self, moves):
+        if isinstance(moves, Game):
+            moves = moves.moves
+        for move in moves:
+            self.numbers.append(int(move.number.rstrip('.')) if move.number else 0)
+            self._append_action(move.white_move)
+            self._append_action(move.black_move)
+        self.game_offsets.append(len(self.numbers))
+        return len(self) - 1
+
+    def _append_action(self, action):
+        kind, piece, from_file, from_rank, to_square, flags = self._encode_action(action)
+        self.kinds.append(kind)
+        self.pieces.append(piece)
+        self.from_files.append(from_file)
+        self.from_ranks.append(from_rank)
+        self.to_squares.append(to_square)
+        self.flags.append(flags)
+
+    def update_action(self, half_move, action):
+        (self.kinds[half_move], self.pieces[half_move], self.from_files[half_move], self.from_ranks[half_move],
+         self.to_squares[half_move], self.flags[half_move]) = self._encode_action(action)
+
+    @staticmethod
+    def _encode_action(action):
+        kind = MoveKind.NONE
+        piece = 0
+        from_file = from_rank = to_square = -1
+        flags = 0
+
+        if isinstance(action, PawnMove):
+            kind = MoveKind.PAWN
+            piece = PIECES.index(action.promotion_piece) if action.promotion_piece else 0
+            to_square = _square_index(action.destination)
+        elif isinstance(action, (PieceMove, Capture)):
+            kind = MoveKind.PIECE if isinstance(action, PieceMove) else MoveKind.CAPTURE
+            piece = PIECES.index(action.piece)
+            if action.origin_file:
+                from_file = FILES.index(action.origin_file)
+            if action.origin_rank:
+                from_rank = int(action.origin_rank) - 1
+            to_square = _square_index(action.destination)
+            if isinstance(action, Capture) and action.promotion_piece:
+                flags |= PIECES.index(action.promotion_piece) << PROMOTION_SHIFT
+        elif isinstance(action, Castle):
+            kind = MoveKind.CASTLE
+            if action.is_kingside:
+                flags |= FLAG_KINGSIDE
+
+        if action is not None:
+            if action.is_check:
+                flags |= FLAG_CHECK
+            if action.is_checkmate:
+                flags |= FLAG_CHECKMATE
+        return kind, piece, from_file, from_rank, to_square, flags
+
+    def move(self, index):
+        number = self.numbers[index]
+        move = Move(f"{number}." if number else None)
+        move.white_move = self.action(2 * index)
+        move.black_move = self.action(2 * index + 1)
+        return move
+
+    def action(self, half_move):
+        kind = self.kinds[half_move]
+        if kind == MoveKind.NONE:
+            return None
+
+        flags = self.flags[half_move]
+        if kind == MoveKind.CASTLE:
+            action = Castle(bool(flags & FLAG_KINGSIDE))
+        else:
+            destination = _square_name(self.to_squares[half_move])
+            piece = self.pieces[half_move]
+            if kind == MoveKind.PAWN:
+                action = PawnMove(destination, PIECES[piece] if piece else None)
+            else:
+                from_file = self.from_files[half_move]
+                from_rank = self.from_ranks[half_move]
+                node_type = PieceMove if kind == MoveKind.PIECE else Capture
+                action = node_type(PIECES[piece],
+                                   FILES[from_file] if from_file >= 0 else None,
+                                   str(from_rank + 1) if from_rank >= 0 else None,
+                                   destination)
+                promotion = flags >> PROMOTION_SHIFT
+                if promotion:
+                    action.promotion_piece = PIECES[promotion]
+
+        action.is_check = bool(flags & FLAG_CHECK)
+        action.is_checkmate = bool(flags & FLAG_CHECKMATE)
+        return action
+
+
+class MoveSequence(Sequence):
+    __slots__ = ('store', 'start', 'stop')
+
+    def __init__(self, store, start, stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("move index out of range")
+        return self.store.move(self.start + index)
+
+
+class GameView(Game):
+    __slots__ = ('store', 'start', 'stop')
+
+    def __init__(self, store, start, stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    @property
+    def moves(self):
+        return MoveSequence(self.store, self.start, self.stop)
+
+
 class ChessParser:
-    def __init__(self, tokens):
-        self.tokens = tokens
+    def __init__(self, tokens, recover=False, game_index=0):
+        self.tokens = iter(tokens)
         self.current = 0
+        self.lookahead = next(self.tokens, None)
+        self.recover = recover
+        self.game_index = game_index
+        self.diagnostics = []
 
     def parse(self):
         game = Game()
+        game.moves.extend(self.iter_moves())
+        return game
 
+    def iter_moves(self):
         while not self.is_at_end():
+            token = self.peek()
             move = self.move()
             if move:
-                game.moves.append(move)
-
-        return game
+                yield move
+            elif self.peek() is token:
+                self.unexpected(token)
 
     def move(self):
         if self.check(TokenType.MOVE_NUM):
@@ -203,13 +418,21 @@ class ChessParser:
             move = Move(move_number)
 
             white_move = self.move_action()
-            if white_move:
-                move.white_move = white_move
+            if not white_move:
+                token = self.peek()
+                if token is None or token.type is TokenType.MOVE_NUM:
+                    self.error(token or move_token, f"Missing move after {move_number!r}")
+                else:
+                    self.unexpected(token)
+                return None
+            move.white_move = white_move
 
             if not self.is_at_end() and not self.check(TokenType.MOVE_NUM):
                 black_move = self.move_action()
                 if black_move:
                     move.black_move = black_move
+                else:
+                    self.unexpected(self.peek())
 
             return move
 
@@ -238,9 +461,10 @@ class ChessParser:
         elif self.check(TokenType.PAWN_CAPTURE):
             token = self.advance()
             origin_file = token.value[0]
-            destination = token.value[2:]
+            destination = token.value[2:4]
+            promotion_piece = token.value[5] if len(token.value) > 4 else None
 
-            capture = Capture("P", origin_file, None, destination)
+            capture = Capture("P", origin_file, None, destination, promotion_piece)
             self.check_for_check_or_checkmate(capture)
 
             return capture
@@ -317,103 +541,179 @@ class ChessParser:
             self.advance()
             move_action.is_checkmate = True
 
+    def unexpected(self, token):
+        if token.type is TokenType.MISMATCH:
+            self.error(token, f"Incorrect character {token.value!r}")
+        else:
+            self.error(token, f"Unexpected {token.type.name} {token.value!r}")
+
+    def error(self, token, message):
+        if not self.recover:
+            raise ValueError(f"{message} at line {token.line}, column {token.column}")
+        self.diagnostics.append(Diagnostic(self.game_index, token.line, token.column, message))
+        while not self.is_at_end() and not self.check(TokenType.MOVE_NUM):
+            self.advance()
+
     def check(self, type):
-        if self.is_at_end():
-            return False
-        return self.peek().type == type
+        return self.lookahead is not None and self.lookahead.type == type
 
     def advance(self):
-        if not self.is_at_end():
+        token = self.lookahead
+        if token is not None:
             self.current += 1
-        return self.tokens[self.current - 1]
+            self.lookahead = next(self.tokens, None)
+        return token
 
     def peek(self):
-        return self.tokens[self.current]
+        return self.lookahead
 
     def is_at_end(self):
-        return self.current >= len(self.tokens)
+        return self.lookahead is None
 
 
-def visualize_ast(ast):
-    result = []
+def _origin(node):
+    origin = ""
+    if node.origin_file:
+        origin += node.origin_file
+    if node.origin_rank:
+        origin += node.origin_rank
+    return origin
 
-    def _visualize_node(node, prefix="", is_last=True, is_root=True):
-        branch = "└── " if is_last else "├── "
 
-        if not is_root:
-            result.append(f"{prefix}{branch}{_node_str(node)}")
-        else:
-            result.append(_node_str(node))
-
-        child_prefix = prefix
-        if not is_root:
-            child_prefix += "    " if is_last else "│   "
-
-        if isinstance(node, Game):
-            for i, move in enumerate(node.moves):
-                _visualize_node(move, child_prefix, i == len(node.moves) - 1, False)
-        elif isinstance(node, Move):
-            white_prefix = child_prefix
-
-            if node.white_move and node.black_move:
-                result.append(f"{child_prefix}├── White: ")
-                _visualize_node(node.white_move, child_prefix + "│   ", False, False)
-
-                result.append(f"{child_prefix}└── Black: ")
-                _visualize_node(node.black_move, child_prefix + "    ", True, False)
-            elif node.white_move:
-                result.append(f"{child_prefix}└── White: ")
-                _visualize_node(node.white_move, child_prefix + "    ", True, False)
-            elif node.black_move:
-                result.append(f"{child_prefix}└── Black: ")
-                _visualize_node(node.black_move, child_prefix + "    ", True, False)
-
-    def _node_str(node):
-        if isinstance(node, Game):
-            return f"Game ({len(node.moves)} moves)"
-        elif isinstance(node, Move):
-            return f"Move {node.number}"
-        elif isinstance(node, PieceMove):
-            origin = ""
-            if node.origin_file:
-                origin += node.origin_file
-            if node.origin_rank:
-                origin += node.origin_rank
-
-            check = "+" if node.is_check else ""
-            checkmate = "#" if node.is_checkmate else ""
-
-            return f"PieceMove: {node.piece}{origin}->{node.destination}{check}{checkmate}"
-        elif isinstance(node, PawnMove):
-            promotion = f"={node.promotion_piece}" if node.promotion_piece else ""
-            check = "+" if node.is_check else ""
-            checkmate = "#" if node.is_checkmate else ""
-
-            return f"PawnMove: ->{node.destination}{promotion}{check}{checkmate}"
-        elif isinstance(node, Capture):
-            origin = ""
-            if node.origin_file:
-                origin += node.origin_file
-            if node.origin_rank:
-                origin += node.origin_rank
-
-            piece_name = "Pawn" if node.piece == "P" else node.piece
-            check = "+" if node.is_check else ""
-            checkmate = "#" if node.is_checkmate else ""
-
-            return f"Capture: {piece_name}{origin}x{node.destination}{check}{checkmate}"
-        elif isinstance(node, Castle):
-            castle_type = "Kingside" if node.is_kingside else "Queenside"
-            check = "+" if node.is_check else ""
-            checkmate = "#" if node.is_checkmate else ""
-
-            return f"Castle: {castle_type}{check}{checkmate}"
+def _suffix(node):
+    check = "+" if node.is_check else ""
+    checkmate = "#" if node.is_checkmate else ""
+    return check + checkmate
+
+
+def san(action, annotations=True):
+    suffix = _suffix(action) if annotations else ""
+    action_type = type(action)
+    if action_type is Castle:
+        return ("O-O" if action.is_kingside else "O-O-O") + suffix
+
+    promotion = f"={action.promotion_piece}" if getattr(action, 'promotion_piece', None) else ""
+    if action_type is PawnMove:
+        return f"{action.destination}{promotion}{suffix}"
+    if action_type is Capture:
+        piece = "" if action.piece == "P" else action.piece
+        return f"{piece}{_origin(action)}x{action.destination}{promotion}{suffix}"
+    if action_type is PieceMove:
+        return f"{action.piece}{_origin(action)}{action.destination}{suffix}"
+    raise ValueError(f"Unsupported move {action!r}")
+
+
+def _game_str(node):
+    return f"Game ({len(node.moves)} moves)"
+
+
+def _move_str(node):
+    return f"Move {node.number}"
+
+
+def _piece_move_str(node):
+    return f"PieceMove: {node.piece}{_origin(node)}->{node.destination}{_suffix(node)}"
+
+
+def _pawn_move_str(node):
+    promotion = f"={node.promotion_piece}" if node.promotion_piece else ""
+    return f"PawnMove: ->{node.destination}{promotion}{_suffix(node)}"
+
+
+def _capture_str(node):
+    piece_name = "Pawn" if node.piece == "P" else node.piece
+    promotion = f"={node.promotion_piece}" if node.promotion_piece else ""
+    return f"Capture: {piece_name}{_origin(node)}x{node.destination}{promotion}{_suffix(node)}"
+
+
+def _castle_str(node):
+    castle_type = "Kingside" if node.is_kingside else "Queenside"
+    return f"Castle: {castle_type}{_suffix(node)}"
+
+
+def _game_children(node, prefix):
+    moves = node.moves
+    last = len(moves) - 1
+    for i, move in enumerate(moves):
+        yield move, prefix, i == last
+
+
+def _move_children(node, prefix):
+    if node.white_move and node.black_move:
+        yield f"{prefix}├── White: "
+        yield node.white_move, prefix + "│   ", False
+        yield f"{prefix}└── Black: "
+        yield node.black_move, prefix + "    ", True
+    elif node.white_move:
+        yield f"{prefix}└── White: "
+        yield node.white_move, prefix + "    ", True
+    elif node.black_move:
+        yield f"{prefix}└── Black: "
+        yield node.black_move, prefix + "    ", True
+
+
+_NODE_STR = {
+    Game: _game_str,
+    Move: _move_str,
+    PieceMove: _piece_move_str,
+    PawnMove: _pawn_move_str,
+    Capture: _capture_str,
+    Castle: _castle_str,
+}
+
+_NODE_CHILDREN = {
+    Game: _game_children,
+    Move: _move_children,
+}
+
+
+def _dispatch(table, node_type):
+    handler = table.get(node_type)
+    if handler is None:
+        for cls in node_type.__mro__:
+            if cls in table:
+                handler = table[node_type] = table[cls]
+                break
+    return handler
+
+
+def _node_str(node):
+    handler = _dispatch(_NODE_STR, type(node))
+    return handler(node) if handler else str(node)
+
+
+def _children(node, prefix):
+    handler = _dispatch(_NODE_CHILDREN, type(node))
+    return handler(node, prefix) if handler else iter(())
+
+
+def write_ast(ast, output):
+    output.write(_node_str(ast) + "\n")
+    stack = [_children(ast, "")]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+        elif isinstance(item, str):
+            output.write(item + "\n")
         else:
-            return str(node)
+            node, prefix, is_last = item
+            branch = "└── " if is_last else "├── "
+            output.write(f"{prefix}{branch}{_node_str(node)}\n")
+            stack.append(_children(node, prefix + ("    " if is_last else "│   ")))
+
 
-    _visualize_node(ast)
+def write_corpus(games, output):
+    for i, game in enumerate(games):
+        if i:
+            output.write("\n")
+        write_ast(game, output)
 
-    return '\n'.join(result)
+
+def visualize_ast(ast):
+    output = io.StringIO()
+    write_ast(ast, output)
+    return output.getvalue()[:-1]
 
 
 test_cases = [
@@ -0,0 +1,196 @@
+import itertools
+import json
+import os
+import struct
+import tempfile
+import time
+from array import array
+
+from board import canonical_actions, replay_game
+from lab6 import ChessParser, iter_lex, lex, san, test_cases
+
+
+MAGIC = b'OPIX1'
+
+
+def move_key(action):
+    return san(action, annotations=False)
+
+
+def move_keys(game):
+    for action in canonical_actions(game):
+        yield move_key(action)
+
+
+class OpeningIndex:
+    def __init__(self, max_depth=24):
+        self.max_depth = max_depth
+        self.keys = []
+        self.key_ids = {}
+        self.children = [{}]
+        self.parents = array('I', [0])
+        self.node_keys = array('I', [0])
+        self.postings = [array('I')]
+        self.next_game_id = 0
+
+    def __len__(self):
+        return len(self.postings[0])
+
+    def _key_id(self, key):
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+    def add_game(self, game, game_id=None):
+        if game_id is None:
+            game_id = self.next_game_id
+        self.next_game_id = max(self.next_game_id, game_id + 1)
+
+        keys = list(itertools.islice(move_keys(game), self.max_depth))
+        node = 0
+        self.postings[0].append(game_id)
+        for key in keys:
+            key_id = self._key_id(key)
+            child = self.children[node].get(key_id)
+            if child is None:
+                child = len(self.children)
+                self.children[node][key_id] = child
+                self.children.append({})
+                self.parents.append(node)
+                self.node_keys.append(key_id)
+                self.postings.append(array('I'))
+            self.postings[child].append(game_id)
+            node = child
+        return game_id
+
+    def add_games(self, games):
+        for game in games:
+            self.add_game(game)
+
+    def _prefix_keys(self, prefix):
+        if isinstance(prefix, str):
+            return list(move_keys(ChessParser(iter_lex(prefix)).parse()))
+        return list(prefix)
+
+    def find(self, prefix):
+        try:
+            keys = self._prefix_keys(prefix)
+        except ValueError:
+            return None
+        node = 0
+        for key in keys:
+            key_id = self.key_ids.get(key)
+            node = self.children[node].get(key_id) if key_id is not None else None
+            if node is None:
+                return None
+        return node
+
+    def count(self, prefix):
+        node = self.find(prefix)
+        return 0 if node is None else len(self.postings[node])
+
+    def games(self, prefix):
+        node = self.find(prefix)
+        return array('I') if node is None else self.postings[node]
+
+    def next_moves(self, prefix):
+        node = self.find(prefix)
+        if node is None:
+            return []
+        stats = [(self.keys[key_id], len(self.postings[child])) for key_id, child in self.children[node].items()]
+        stats.sort(key=lambda item: -item[1])
+        return stats
+
+    def line(self, node):
+        keys = []
+        while node:
+            keys.append(self.keys[self.node_keys[node]])
+            node = self.parents[node]
+        return keys[::-1]
+
+    def to_bytes(self):
+        header = json.dumps({'max_depth': self.max_depth, 'next_game_id': self.next_game_id, 'keys': self.keys},
+                            ensure_ascii=False).encode('utf-8')
+        lengths = array('I', [len(postings) for postings in self.postings])
+        return b''.join([MAGIC, struct.pack('<QQ', len(header), len(self.postings)), header,
+                         self.parents.tobytes(), self.node_keys.tobytes(), lengths.tobytes()] +
+                        [postings.tobytes() for postings in self.postings])
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not an opening index")
+        pos = len(MAGIC)
+        header_size, node_count = struct.unpack_from('<QQ', data, pos)
+        pos += struct.calcsize('<QQ')
+        header = json.loads(data[pos:pos + header_size].decode('utf-8'))
+        pos += header_size
+
+        index = cls(header['max_depth'])
+        index.next_game_id = header['next_game_id']
+        index.keys = header['keys']
+        index.key_ids = {key: key_id for key_id, key in enumerate(index.keys)}
+
+        columns = []
+        for _ in range(3):
+            column = array('I')
+            column.frombytes(data[pos:pos + column.itemsize * node_count])
+            pos += column.itemsize * node_count
+            columns.append(column)
+        index.parents, index.node_keys, lengths = columns
+
+        index.children = [{} for _ in range(node_count)]
+        index.postings = []
+        for node in range(node_count):
+            postings = array('I')
+            postings.frombytes(data[pos:pos + postings.itemsize * lengths[node]])
+            pos += postings.itemsize * lengths[node]
+            index.postings.append(postings)
+            if node:
+                index.children[index.parents[node]][index.node_keys[node]] = node
+        return index
+
+    def save(self, path):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.to_bytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def main():
+    index = OpeningIndex()
+    index.add_games(ChessParser(lex(moves)).parse() for moves in test_cases)
+
+    for prefix in ["1. e4", "1. e4 e5 2. Nf3", "1. d4"]:
+        print(f"{prefix}: {index.count(prefix)} games {list(index.games(prefix))}, "
+              f"next moves {index.next_moves(prefix)}")
+
+    replayed = [ChessParser(lex(moves)).parse() for moves in test_cases]
+    for game in replayed:
+        replay_game(game)
+    print(f"keys unchanged by replay: "
+          f"{all(list(move_keys(game)) == list(move_keys(ChessParser(lex(moves)).parse())) for moves, game in zip(test_cases, replayed))}")
+
+    restored = OpeningIndex.from_bytes(index.to_bytes())
+    repeats = 100000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        restored.next_moves(["e4", "e5", "Nf3"])
+    elapsed = time.perf_counter() - start
+    print(f"\nnext_moves after round trip: {restored.next_moves(['e4', 'e5', 'Nf3'])} "
+          f"({elapsed / repeats * 1e6:.2f} µs per query)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from board import GameIssue, replay_game
+from lab6 import ChessParser, Diagnostic, GameStore, iter_lex, visualize_ast
+
+
+tag_pattern = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+result_pattern = re.compile(r'(1-0|0-1|1/2-1/2|\*)\s*$')
+end_result_pattern = re.compile(r'(?:^|\s)(?:1-0|0-1|1/2-1/2|\*)\s*$')
+delimiter_pattern = re.compile(r'[{};()]')
+comment_pattern = re.compile(r'\{[^}]*\}|;[^\n]*|^%[^\n]*', re.MULTILINE)
+variation_pattern = re.compile(r'\([^()]*\)')
+noise_pattern = re.compile(r'\$\d+|[!?]+|\d+\.\.\.|\be\.p\.')
+
+
+class PgnGame:
+    __slots__ = ('headers', 'result', 'game', 'diagnostics', 'issues')
+
+    def __init__(self, headers, result, game, diagnostics=(), issues=()):
+        self.headers = headers
+        self.result = result
+        self.game = game
+        self.diagnostics = list(diagnostics)
+        self.issues = list(issues)
+
+    def __repr__(self):
+        white = self.headers.get('White', '?')
+        black = self.headers.get('Black', '?')
+        return f"PgnGame({white} vs {black}, {self.result}, {len(self.game.moves)} moves)"
+
+
+def scan_movetext(line, comment=False, depth=0):
+    tail = []
+    pos = 0
+    for match in delimiter_pattern.finditer(line):
+        char = match.group()
+        if comment:
+            if char == '}':
+                comment = False
+                pos = match.end()
+            continue
+        if depth == 0:
+            tail.append(line[pos:match.start()])
+        pos = match.end()
+        if char == '{':
+            comment = True
+        elif char == ';':
+            pos = len(line)
+            break
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+    if not comment and depth == 0:
+        tail.append(line[pos:])
+    ends_game = not comment and depth == 0 and end_result_pattern.search(''.join(tail)) is not None
+    return comment, depth, ends_game
+
+
+def split_games(lines):
+    chunk = []
+    in_movetext = False
+    comment = False
+    depth = 0
+    for line in lines:
+        stripped = line.strip()
+        if comment or depth:
+            comment, depth, ends_game = scan_movetext(line, comment, depth)
+        elif stripped.startswith('['):
+            if in_movetext:
+                yield ''.join(chunk)
+                chunk = []
+                in_movetext = False
+            ends_game = False
+        elif stripped and not stripped.startswith('%'):
+            in_movetext = True
+            comment, depth, ends_game = scan_movetext(line)
+        else:
+            ends_game = False
+        chunk.append(line)
+        if ends_game:
+            yield ''.join(chunk)
+            chunk = []
+            in_movetext = False
+
+    if any(line.strip() for line in chunk):
+        yield ''.join(chunk)
+
+
+def parse_headers(text, diagnostics=None, game_index=0):
+    headers = {}
+    movetext = []
+    for line_num, line in enumerate(text.splitlines(keepends=True), 1):
+        stripped = line.strip()
+        if stripped.startswith('['):
+            match = tag_pattern.fullmatch(stripped)
+            if match:
+                headers[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+            elif diagnostics is None:
+                raise ValueError(f"Malformed tag pair {stripped!r}")
+            else:
+                column = len(line) - len(line.lstrip()) + 1
+                diagnostics.append(Diagnostic(game_index, line_num, column, f"Malformed tag pair {stripped!r}"))
+            movetext.append('\n')
+        else:
+            movetext.append(line)
+    return headers, ''.join(movetext)
+
+
+def _blank(match):
+    return '\n' * match.group().count('\n') or ' '
+
+
+def clean_movetext(movetext):
+    movetext = comment_pattern.sub(_blank, movetext)
+    while True:
+        movetext, count = variation_pattern.subn(_blank, movetext)
+        if not count:
+            break
+    movetext = noise_pattern.sub(' ', movetext)
+
+    result = None
+    match = result_pattern.search(movetext)
+    if match:
+        result = match.group(1)
+        movetext = movetext[:match.start()]
+    return movetext, result
+
+
+def parse_game(text, recover=False, game_index=0):
+    diagnostics = [] if recover else None
+    headers, movetext = parse_headers(text, diagnostics, game_index)
+    movetext, result = clean_movetext(movetext)
+    parser = ChessParser(iter_lex(movetext, recover), recover, game_index)
+    game = parser.parse()
+    if recover:
+        diagnostics.extend(parser.diagnostics)
+    return PgnGame(headers, result or headers.get('Result'), game, diagnostics or ())
+
+
+def _parse_batch(texts, first=0, recover=False, replay=False):
+    store = GameStore()
+    meta = []
+    for game_index, text in enumerate(texts, first):
+        pgn_game = parse_game(text, recover, game_index)
+        issues = replay_game(pgn_game.game) if replay else []
+        store.add_game(pgn_game.game)
+        meta.append((pgn_game.headers, pgn_game.result, pgn_game.diagnostics, issues))
+    return store.to_bytes(), json.dumps(meta, ensure_ascii=False)
+
+
+def _decode_batch(payload):
+    data, meta = payload
+    store = GameStore.from_bytes(data)
+    for game, (headers, result, diagnostics, issues) in zip(store, json.loads(meta)):
+        yield PgnGame(headers, result, game, [Diagnostic(*diagnostic) for diagnostic in diagnostics],
+                      [GameIssue(*issue) for issue in issues])
+
+
+def _batches(games, batch_size):
+    games = iter(games)
+    while True:
+        batch = list(itertools.islice(games, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_pgn(source, processes=None, ordered=True, batch_size=256, recover=False, replay=False):
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', errors='replace') as f:
+            yield from read_pgn(f, processes, ordered, batch_size, recover, replay)
+        return
+
+    batches = _batches(split_games(source), batch_size)
+    firsts = itertools.count(0, batch_size)
+    if processes == 1:
+        for batch, first in zip(batches, firsts):
+            yield from _decode_batch(_parse_batch(batch, first, recover, replay))
+        return
+
+    limit = 2 * (processes or os.cpu_count() or 1)
+    with ProcessPoolExecutor(processes) as executor:
+        if ordered:
+            pending = deque()
+            for batch, first in zip(batches, firsts):
+                pending.append(executor.submit(_parse_batch, batch, first, recover, replay))
+                if len(pending) >= limit:
+                    yield from _decode_batch(pending.popleft().result())
+            while pending:
+                yield from _decode_batch(pending.popleft().result())
+        else:
+            pending = set()
+            for batch, first in zip(batches, firsts):
+                pending.add(executor.submit(_parse_batch, batch, first, recover, replay))
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from _decode_batch(future.result())
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _decode_batch(future.result())
+
+
+sample_pgn = """[Event "Casual Game"]
+[Site "London"]
+[White "Anderssen, Adolf"]
+[Black "Kieseritzky, Lionel"]
+[Result "1-0"]
+
+1. e4 e5 2. f4 exf4 3. Bc4 Qh4+ 4. Kf1 b5 {Bryan Countergambit} 5. Bxb5 Nf6 6. Nf3 Qh6
+7. d3 Nh5 8. Nh4 Qg5 9. Nf5 c6 10. g4 Nf6 11. Rg1 cxb5 12. h4 Qg6 13. h5 Qg5 14. Qf3
+Ng8 15. Bxf4 Qf6 16. Nc3 Bc5 17. Nd5 Qxb2 18. Bd6 Bxg1 (18... Qxa1+ 19. Ke2 Qb2) 19. e5
+Qxa1+ 20. Ke2 Na6 21. Nxg7+ Kd8 22. Qf6+ Nxf6 23. Be7# 1-0
+
+[Event "Promotion test"]
+[White "A"]
+[Black "B"]
+
+1. e4 d5 2. exd5 c6 3. dxc6 Qd7 4. cxb7 Qe6+ 5. Be2 Qxe4 6. bxa8=Q *
+"""
+
+dirty_pgn = """[Event "Corrupt dump"]
+[White "A"
+[Black "B"]
+
+1. e4 e5 2. Nf3 N@c6 3. Bb5 a6 4. Ba4 Nf6 5. 6. Re1 b5 *
+
+[Event "Clean"]
+
+1. d4 d5 2. c4 e6 *
+"""
+
+
+def main():
+    games = list(read_pgn(io.StringIO(sample_pgn), processes=1, replay=True))
+    for pgn_game in games:
+        print(pgn_game)
+        for issue in pgn_game.issues:
+            print(f"  {issue}")
+    print()
+    print(visualize_ast(games[1].game))
+
+    print("\nRecovering from a corrupt dump:")
+    for pgn_game in read_pgn(io.StringIO(dirty_pgn), processes=1, recover=True):
+        print(pgn_game)
+        for diagnostic in pgn_game.diagnostics:
+            print(f"  {diagnostic}")
+
+    if len(sys.argv) > 1:
+        start = time.perf_counter()
+        count = diagnostics = issues = plies = 0
+        for pgn_game in read_pgn(sys.argv[1], recover=True, replay=True):
+            count += 1
+            diagnostics += len(pgn_game.diagnostics)
+            issues += len(pgn_game.issues)
+            plies += sum(1 for move in pgn_game.game.moves
+                         for action in (move.white_move, move.black_move) if action is not None)
+        elapsed = time.perf_counter() - start
+        print(f"\n{count} games ({diagnostics} diagnostics, {issues} illegal) from {sys.argv[1]} "
+              f"in {elapsed:.2f}s ({plies / elapsed:,.0f} moves/s parsed and replayed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from lab6 import san, visualize_ast
+from pgn import parse_game, sample_pgn, scan_movetext
+
+
+def _process_game(text, game_index, output):
+    try:
+        pgn_game = parse_game(text, recover=True, game_index=game_index)
+    except Exception as e:
+        return json.dumps({'game': game_index, 'error': str(e)}, ensure_ascii=False), False
+
+    result = {
+        'game': game_index,
+        'headers': pgn_game.headers,
+        'result': pgn_game.result,
+        'diagnostics': [diagnostic._asdict() for diagnostic in pgn_game.diagnostics],
+    }
+    if output == 'ast':
+        result['ast'] = visualize_ast(pgn_game.game)
+    else:
+        result['moves'] = [san(action) for move in pgn_game.game.moves
+                           for action in (move.white_move, move.black_move) if action is not None]
+    return json.dumps(result, ensure_ascii=False), not pgn_game.diagnostics
+
+
+class ServiceStats:
+    def __init__(self, window=1024):
+        self.started = time.monotonic()
+        self.connections = 0
+        self.active = 0
+        self.games = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, ok):
+        self.games += 1
+        if not ok:
+            self.failed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latencies.append(latency)
+
+    def _percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_dict(self):
+        uptime = time.monotonic() - self.started
+        return {
+            'uptime': uptime,
+            'connections': self.connections,
+            'active': self.active,
+            'games': self.games,
+            'failed': self.failed,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'games_per_second': self.games / uptime if uptime else 0.0,
+            'bytes_per_second': self.bytes_in / uptime if uptime else 0.0,
+            'latency_mean_ms': 1000 * self.latency_total / self.games if self.games else 0.0,
+            'latency_p50_ms': 1000 * self._percentile(0.5),
+            'latency_p99_ms': 1000 * self._percentile(0.99),
+            'latency_max_ms': 1000 * self.latency_max,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def __str__(self):
+        stats = self.to_dict()
+        return (f"{stats['games']} games ({stats['failed']} with diagnostics) over {stats['connections']} "
+                f"connections, {stats['games_per_second']:.0f} games/s, "
+                f"latency mean {stats['latency_mean_ms']:.2f}ms p50 {stats['latency_p50_ms']:.2f}ms "
+                f"p99 {stats['latency_p99_ms']:.2f}ms max {stats['latency_max_ms']:.2f}ms")
+
+
+class PgnService:
+    OUTPUTS = ('json', 'ast')
+
+    def __init__(self, processes=None, max_pending=None, max_clients=256, window=32,
+                 max_game_bytes=1024 * 1024, output='json'):
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Unknown output format {output!r}")
+        self.processes = processes
+        self.max_pending = max_pending or 4 * (processes or os.cpu_count() or 1)
+        self.max_clients = max_clients
+        self.window = window
+        self.max_game_bytes = max_game_bytes
+        self.output = output
+        self.stats = ServiceStats()
+        self.executor = None
+        self.server = None
+        self.handlers = set()
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        self.executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+        self.pending = asyncio.Semaphore(self.max_pending)
+        self.clients = asyncio.Semaphore(self.max_clients)
+        limit = self.max_game_bytes + 1
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=limit)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=limit)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for handler in list(self.handlers):
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _ready(self, line):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result((line, True))
+        return future, None
+
+    async def _submit(self, results, text, game_index, output):
+        await self.pending.acquire()
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, _process_game, text, game_index, output)
+        future.add_done_callback(lambda _: self.pending.release())
+        await results.put((future, started))
+
+    async def _send(self, results, writer):
+        connected = True
+        while True:
+            item = await results.get()
+            if item is None:
+                return
+            future, started = item
+            try:
+                line, ok = await future
+            except Exception as e:
+                line, ok = json.dumps({'error': str(e)}), False
+
+            if connected:
+                data = line.encode('utf-8') + b'\n'
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    self.stats.bytes_out += len(data)
+                except ConnectionError:
+                    connected = False
+            if started is not None:
+                self.stats.record(time.perf_counter() - started, ok)
+
+    async def _command(self, results, command, state):
+        name, _, argument = command.partition(' ')
+        if name == 'stats' and not argument:
+            await results.put(self._ready(json.dumps({'stats': self.stats.to_dict()})))
+        elif name == 'format' and argument in self.OUTPUTS:
+            state['output'] = argument
+        else:
+            return False
+        return True
+
+    async def handle(self, reader, writer):
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        handler.add_done_callback(self.handlers.discard)
+        async with self.clients:
+            self.stats.connections += 1
+            self.stats.active += 1
+            results = asyncio.Queue(self.window)
+            sender = asyncio.create_task(self._send(results, writer))
+            state = {'output': self.output}
+            chunk = []
+            size = 0
+            in_movetext = False
+            oversized = False
+            comment = False
+            depth = 0
+            game_index = 0
+
+            async def flush():
+                nonlocal chunk, size, in_movetext, oversized, comment, depth, game_index
+                if oversized:
+                    await results.put(self._ready(json.dumps(
+                        {'game': game_index, 'error': f"Game exceeds {self.max_game_bytes} bytes"})))
+                    self.stats.record(0.0, False)
+                elif any(line.strip() for line in chunk):
+                    await self._submit(results, ''.join(chunk), game_index, state['output'])
+                else:
+                    return
+                game_index += 1
+                chunk = []
+                size = 0
+                in_movetext = False
+                oversized = False
+                comment = False
+                depth = 0
+
+            try:
+                while True:
+                    try:
+                        data = await reader.readuntil(b'\n')
+                    except asyncio.IncompleteReadError as e:
+                        data = e.partial
+                    except asyncio.LimitOverrunError as e:
+                        self.stats.bytes_in += len(await reader.readexactly(e.consumed))
+                        in_movetext = oversized = True
+                        continue
+                    except ConnectionError:
+                        break
+                    if not data:
+                        break
+                    self.stats.bytes_in += len(data)
+                    line = data.decode('utf-8', errors='replace')
+                    stripped = line.strip()
+
+                    if line.startswith('%%') and await self._command(results, line[2:].rstrip('\r\n'), state):
+                        continue
+                    if comment or depth:
+                        comment, depth, ends_game = scan_movetext(line, comment, depth)
+                    elif stripped.startswith('['):
+                        if in_movetext:
+                            await flush()
+                        ends_game = False
+                    elif stripped and not stripped.startswith('%'):
+                        in_movetext = True
+                        comment, depth, ends_game = scan_movetext(line)
+                    else:
+                        ends_game = False
+
+                    if not oversized:
+                        size += len(data)
+                        if size > self.max_game_bytes:
+                            chunk = []
+                            oversized = True
+                        else:
+                            chunk.append(line)
+                    if ends_game:
+                        await flush()
+                await flush()
+                await results.put(None)
+                await sender
+            except asyncio.CancelledError:
+                pass
+            finally:
+                sender.cancel()
+                self.stats.active -= 1
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass
+
+
+async def stream_pgn(text, host='127.0.0.1', port=None, path=None, chunk_size=4096):
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    async def send():
+        data = text.encode('utf-8')
+        for start in range(0, len(data), chunk_size):
+            writer.write(data[start:start + chunk_size])
+            await writer.drain()
+        writer.write_eof()
+
+    sender = asyncio.create_task(send())
+    results = []
+    async for line in reader:
+        results.append(json.loads(line))
+    await sender
+    writer.close()
+    await writer.wait_closed()
+    return results
+
+
+async def serve(address):
+    service = PgnService()
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        await service.start(host, int(port))
+    else:
+        await service.start(path=address)
+    print(f"Serving on {address}")
+    try:
+        async with service.server:
+            await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+async def demo(clients=16, copies=200):
+    service = PgnService(processes=2)
+    server = await service.start()
+    port = server.sockets[0].getsockname()[1]
+    try:
+        results = await asyncio.gather(*(stream_pgn(sample_pgn * copies, port=port) for _ in range(clients)))
+        first = results[0][0]
+        print(f"game {first['game']}: {first['headers']['White']} vs {first['headers']['Black']}, "
+              f"{first['result']}, {' '.join(first['moves'][:8])} ...")
+        print(f"{sum(len(games) for games in results)} games from {clients} clients")
+
+        stats = await stream_pgn("%%stats\n", port=port)
+        print(f"stats command: games={stats[0]['stats']['games']}")
+        print(service.stats)
+    finally:
+        await service.close()
+
+
+def main():
+    if len(sys.argv) > 1:
+        asyncio.run(serve(sys.argv[1]))
+    else:
+        asyncio.run(demo())
+
+
+if __name__ == "__main__":
+    main()